@@ -0,0 +1,426 @@
+"""
+benchmarks of the hot paths, from payload generation to full IRN requests
+
+    python -m benchmarks.bench --output results.json
+    python -m benchmarks.bench --only crypto --compare results.json
+
+every benchmark reports the median time per call, the fastest time and the
+calls per second. results are saved as JSON along with the library version
+and the python version, so that runs can be compared across versions.
+end-to-end benchmarks run against the local mock IRP.
+"""
+
+import argparse
+import base64
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+from src.gst_irn import crypto, qr
+from src.gst_irn.codec import get_codec
+from src.gst_irn.codes import States
+from src.gst_irn.ledger import SQLiteLedger
+from src.gst_irn.generators import (
+    get_buyer_dtls,
+    get_doc_dtls,
+    get_invoice,
+    get_item,
+    get_seller_dtls,
+    get_tran_dtls,
+    get_val_dtls,
+)
+from src.gst_irn.mock_irp import MockIRP
+from src.gst_irn.session import Session, _get_encrypted_payload
+from src.gst_irn.token_store import (
+    FileTokenStore,
+    MemoryTokenStore,
+    SQLiteTokenStore,
+)
+
+ITEM_COUNTS = (1, 10, 100, 1000, 5000)
+PAYLOAD_SIZES = (256, 4 * 1024, 64 * 1024, 1024 * 1024)
+# statements timed in a new interpreter by the imports benchmark
+IMPORTS = {
+    "package": "import src.gst_irn",
+    "generators": "from src.gst_irn import get_invoice",
+    "session": "from src.gst_irn import Session",
+    "qr": "import src.gst_irn.qr",
+}
+SIGNED_QR_CODE = "eyJhbGciOiJSUzI1NiJ9." + "x" * 600 + ".signature"
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """
+    returns timings of func in seconds per call
+
+    func is called in loops taking at least `min_time` seconds, `repeat`
+    times. the median of the loops is less affected by noise than the mean.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    timings = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return get_timing(timings, number)
+
+
+def get_timing(timings, number=1):
+    median = statistics.median(timings)
+    return {
+        "median": median,
+        "best": min(timings),
+        "per_sec": 1 / median,
+        "calls": number * len(timings),
+    }
+
+
+def get_items(count):
+    return [
+        dict(
+            sl_no=str(i),
+            is_servc="N",
+            hsn_cd="1001",
+            qty=10,
+            unit="NOS",
+            unit_price=100,
+            tot_amt=1000,
+            ass_amt=1000,
+            gst_rt=12.0,
+            igst_amt=120,
+            tot_item_val=1120,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def build_invoice(items, doc_no="A/1"):
+    count = len(items)
+    return get_invoice(
+        tran_dtls=get_tran_dtls(),
+        doc_dtls=get_doc_dtls(typ="INV", no=doc_no, dt="12/09/2022"),
+        seller_dtls=get_seller_dtls(
+            gstin="09AAJCM7191E1Z5",
+            lgl_nm="Foobar",
+            addr1="foobar",
+            loc="foobar",
+            pin=226001,
+            stcd=States.UTTAR_PRADESH.value,
+        ),
+        buyer_dtls=get_buyer_dtls(
+            gstin="37AABCA7365E2ZP",
+            lgl_nm="AVANTI",
+            pos=States.ANDHRA_PRADESH.value,
+            addr1="VEMULURU",
+            loc="VEMULURU",
+            pin=534350,
+            stcd=States.ANDHRA_PRADESH.value,
+        ),
+        item_list=[get_item(**item) for item in items],
+        val_dtls=get_val_dtls(
+            ass_val=1000 * count,
+            igst_val=120 * count,
+            tot_inv_val=1120 * count,
+        ),
+    )
+
+
+def bench_generators():
+    """
+    building, serializing and encrypting invoices of different sizes
+    """
+    json_codec = get_codec("json")
+    fast_codec = get_codec()
+    context = crypto.CryptoContext(base64.b64encode(os.urandom(32)).decode())
+    for count in ITEM_COUNTS:
+        items = get_items(count)
+        invoice = build_invoice(items)
+        payload = json_codec.dumps(invoice)
+        params = {"items": count, "bytes": len(payload)}
+        yield "invoice.build", params, lambda: build_invoice(items)
+        yield "invoice.dumps.json", params, lambda: json_codec.dumps(invoice)
+        if fast_codec.name != "json":
+            name = f"invoice.dumps.{fast_codec.name}"
+            yield name, params, lambda: fast_codec.dumps(invoice)
+        yield "invoice.encrypt", params, lambda: _get_encrypted_payload(
+            invoice, context, fast_codec
+        )
+
+
+def bench_crypto():
+    """
+    AES encryption by payload size and RSA encryption of the auth payload
+    """
+    context = crypto.CryptoContext(base64.b64encode(os.urandom(32)).decode())
+    for size in PAYLOAD_SIZES:
+        message = os.urandom(size)
+        encrypted = context.encrypt(message)
+        params = {"bytes": size}
+        yield "aes.encrypt", params, lambda: context.encrypt(message)
+        yield "aes.decrypt", params, lambda: context.decrypt(
+            encrypted, raw=True
+        )
+
+    with MockIRP() as irp:
+        public_key = irp.public_key
+    # the auth payload is encrypted in one block, like the app key
+    message = os.urandom(200)
+
+    def encrypt_cold():
+        crypto.load_public_key.cache_clear()
+        crypto.encrypt_with_rsa_pub_key(message, public_key)
+
+    yield "rsa.encrypt", {"key": "cached"}, lambda: (
+        crypto.encrypt_with_rsa_pub_key(message, public_key)
+    )
+    yield "rsa.encrypt", {"key": "parsed"}, encrypt_cold
+
+
+def bench_qr():
+    """
+    QR code rendering, uncached and from the cache
+    """
+    for format in ("png", "svg"):
+        params = {"format": format}
+        key = (format, SIGNED_QR_CODE)
+        yield "qr.render", params, lambda: qr._render(key)
+        qr._get_rendered(*key)
+        yield "qr.cached", params, lambda: qr._get_rendered(*key)
+
+
+def get_session(irp, token_store=None, **kwargs):
+    return Session(
+        gstin="09AAJCM7191E1Z5",
+        client_id="client",
+        client_secret="secret",
+        username="user",
+        password="password",
+        public_key=irp.public_key,
+        base_url=irp.url,
+        token_store=token_store or MemoryTokenStore(),
+        **kwargs,
+    )
+
+
+def bench_tokens():
+    """
+    cost of getting a token from memory, from the token stores and the IRP
+    """
+    with MockIRP() as irp, tempfile.TemporaryDirectory() as tmp:
+        stores = {
+            "memory": MemoryTokenStore(),
+            "file": FileTokenStore(tmp),
+            "sqlite": SQLiteTokenStore(os.path.join(tmp, "tokens.sqlite3")),
+        }
+        for name, store in stores.items():
+            session = get_session(irp, store)
+            session.generate_token()
+            if name == "memory":
+                yield "token.session_hit", {}, session.generate_token
+
+            def store_hit(session=session):
+                # forget the token held by the session to read the store
+                session._auth_token = None
+                session.generate_token()
+
+            yield "token.store_hit", {"store": name}, store_hit
+            session.close()
+
+        session = get_session(irp)
+        yield "token.miss", {}, lambda: session.generate_token(
+            force_regenerate_token=True
+        )
+        session.close()
+
+
+def bench_session():
+    """
+    IRN generation against the mock IRP, one by one and in bulk
+    """
+    invoice = build_invoice(get_items(10))
+    counter = iter(range(10**9))
+
+    def next_invoice():
+        # document numbers must be unique to avoid duplicate IRNs
+        doc_dtls = dict(invoice["DocDtls"], No=f"B/{next(counter)}")
+        return dict(invoice, DocDtls=doc_dtls)
+
+    with MockIRP(validate=False) as irp, get_session(irp) as session:
+        session.generate_token()
+        yield "session.generate_e_invoice", {"items": 10}, lambda: (
+            session.generate_e_invoice(next_invoice())
+        )
+        for workers in (1, 8):
+            batch = 50
+            params = {"items": 10, "workers": workers, "batch": batch}
+
+            def bulk(workers=workers):
+                invoices = [next_invoice() for _ in range(batch)]
+                for result in session.generate_e_invoices(
+                    invoices, max_workers=workers
+                ):
+                    if isinstance(result, Exception):
+                        raise result
+
+            yield "session.generate_e_invoices", params, bulk
+
+    # reprints, from the IRP and from the ledger
+    with MockIRP(validate=False) as irp, tempfile.TemporaryDirectory() as tmp:
+        ledger = SQLiteLedger(os.path.join(tmp, "e_invoices.sqlite3"))
+        for use_ledger in (False, True):
+            session = get_session(irp, ledger=ledger if use_ledger else None)
+            session.generate_token()
+            irn = session.generate_e_invoice(next_invoice())["Irn"]
+            params = {"ledger": use_ledger}
+            yield "session.get_e_invoice_by_irn", params, lambda: (
+                session.get_e_invoice_by_irn(irn)
+            )
+            session.close()
+        ledger.close()
+
+
+def get_import_time(statement):
+    """
+    returns seconds taken by the imports of the statement in a new python
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    # cumulative microseconds of the top level imports, after the imports
+    # of python's startup (which end with site)
+    total = 0
+    started = False
+    for line in output.splitlines():
+        _, cumulative, name = line.split("|")
+        # imports of the imported modules are indented
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue
+        if started:
+            total += int(cumulative)
+        started = started or name.strip() == "site"
+    return total / 1e6
+
+
+def bench_imports(repeat=5):
+    """
+    cold import time of the package, in new interpreters
+    """
+    for name, statement in IMPORTS.items():
+        timings = [get_import_time(statement) for _ in range(repeat)]
+        yield "import", {"module": name}, timings
+
+
+BENCHMARKS = {
+    "generators": bench_generators,
+    "crypto": bench_crypto,
+    "qr": bench_qr,
+    "tokens": bench_tokens,
+    "session": bench_session,
+    "imports": bench_imports,
+}
+
+
+def get_version():
+    try:
+        from importlib.metadata import version
+
+        return version("gst-e-invoicing")
+    except Exception:
+        return None
+
+
+def run(names, repeat=5, min_time=0.2):
+    """
+    runs the benchmark groups of given names and returns the results
+    """
+    results = []
+    for group in names:
+        for name, params, func in BENCHMARKS[group]():
+            if callable(func):
+                timing = measure(func, repeat=repeat, min_time=min_time)
+            else:
+                # timings measured by the benchmark itself
+                timing = get_timing(func)
+            result = {"group": group, "name": name, "params": params}
+            result.update(timing)
+            print(format_result(result), file=sys.stderr)
+            results.append(result)
+    return {
+        "version": get_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "codec": get_codec().name,
+        "time": dt.datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+
+
+def get_key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def format_result(result, baseline=None):
+    params = " ".join(f"{k}={v}" for k, v in result["params"].items())
+    line = (
+        f"{result['name']:<28} {params:<32} "
+        f"{result['median'] * 1000:>10.3f} ms {result['per_sec']:>12.1f}/s"
+    )
+    if baseline is not None:
+        change = result["median"] / baseline["median"] - 1
+        line += f" {change:>+8.1%}"
+    return line
+
+
+def compare(report, baseline):
+    """
+    prints the change in median time of every benchmark from the baseline
+    """
+    previous = {get_key(result): result for result in baseline["results"]}
+    print(f"compared with {baseline['version']} ({baseline['time']})")
+    for result in report["results"]:
+        print(format_result(result, previous.get(get_key(result))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=list(BENCHMARKS),
+        help="run only the given group (can be repeated)",
+    )
+    parser.add_argument("--output", help="json file to save the results in")
+    parser.add_argument(
+        "--compare", help="json file of an earlier run to compare with"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="minimum seconds per timing loop",
+    )
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.only or list(BENCHMARKS),
+        repeat=args.repeat,
+        min_time=args.min_time,
+    )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(report, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,4 +12,13 @@ from .generators import (
     get_tran_dtls,
     get_val_dtls,
 )
-from .session import Session
+
+
+def __getattr__(name):
+    # the session needs requests and cryptography, which are slow to import.
+    # it is imported on first use, so that building invoices stays fast.
+    if name == "Session":
+        from .session import Session
+
+        return Session
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
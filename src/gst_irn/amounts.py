@@ -0,0 +1,170 @@
+"""
+computes the amounts of items and invoice totals from columns of item data
+
+    item_list, val_dtls = compute_amounts(
+        hsn_cd=["1001", "1002"],
+        is_servc="N",
+        qty=[10, 2.5],
+        unit_price=[100, 40.5],
+        gst_rt=[5, 18],
+        is_igst=False,
+    )
+    invoice = get_invoice(..., item_list=item_list, val_dtls=val_dtls)
+
+the amounts are computed in integer paise, rounding half up to 2 decimals
+like the IRP, so that they match its validations.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import repeat
+
+from .generators import get_val_dtls
+from .models import to_camel_case
+
+
+def _to_units(value, scale):
+    """
+    returns the value as integer multiples of 1 / scale, rounding half up
+    """
+    if isinstance(value, int):
+        return value * scale
+    if isinstance(value, float):
+        units = value * scale
+        rounded = round(units)
+        # values with more decimals than the scale are rounded as decimals
+        if abs(units - rounded) < 1e-6:
+            return rounded
+        value = repr(value)
+    value = Decimal(value) * scale
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _div_round(numerator, denominator):
+    """
+    integer division rounding half up (away from zero)
+    """
+    if numerator < 0:
+        return -_div_round(-numerator, denominator)
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def _get_column(column, size):
+    """
+    returns the column as a sequence of given size. scalars are repeated.
+    """
+    if column is None or isinstance(column, (str, int, float, Decimal)):
+        return [column] * size
+    if len(column) != size:
+        raise ValueError(f"column has {len(column)} rows instead of {size}")
+    return column
+
+
+def _get_units(column, size, scale):
+    return [
+        0 if value is None else _to_units(value, scale)
+        for value in _get_column(column, size)
+    ]
+
+
+def compute_amounts(
+    *,
+    qty,
+    unit_price,
+    gst_rt,
+    discount=None,
+    ces_rt=None,
+    oth_chrg=None,
+    is_igst=False,
+    round_off=False,
+    **columns,
+):
+    """
+    returns (item_list, val_dtls) computed from the columns of items
+
+    qty, unit_price, gst_rt and the optional discount, ces_rt (cess rate)
+    and oth_chrg are lists with a value for every item. other columns (like
+    hsn_cd or prd_desc) are copied to the items. any column can also be a
+    single value for all the items. sl_no defaults to 1, 2, 3...
+
+    is_igst is True for inter-state supplies. with round_off=True the
+    invoice total is rounded to rupees, setting RndOffAmt.
+
+    the items are the same as returned by `get_item`.
+    """
+    size = len(qty)
+    if columns.get("sl_no") is None:
+        columns["sl_no"] = [str(i) for i in range(1, size + 1)]
+    columns.update(
+        qty=qty,
+        unit_price=unit_price,
+        gst_rt=gst_rt,
+        discount=discount,
+        ces_rt=ces_rt,
+        oth_chrg=oth_chrg,
+    )
+    given = [
+        (to_camel_case(name), _get_column(column, size))
+        for name, column in columns.items()
+        if column is not None
+    ]
+
+    # qty and unit price have up to 3 decimals, so their product is in
+    # millionths of rupees. the other amounts are in paise.
+    amounts = zip(
+        _get_units(qty, size, 1000),
+        _get_units(unit_price, size, 1000),
+        _get_units(discount, size, 100),
+        _get_units(gst_rt, size, 100),
+        _get_units(ces_rt, size, 100),
+        _get_units(oth_chrg, size, 100),
+    )
+    computed = []
+    ass_val = igst_val = gst_val = ces_val = oth_val = 0
+    for qty_units, price_units, disc, gst_rate, ces_rate, oth in amounts:
+        tot = _div_round(qty_units * price_units, 10000)
+        ass = tot - disc
+        if is_igst:
+            igst = _div_round(ass * gst_rate, 10000)
+            cgst = 0
+        else:
+            igst = 0
+            cgst = _div_round(ass * gst_rate, 20000)
+        ces = _div_round(ass * ces_rate, 10000) if ces_rate else 0
+        computed.append(
+            (tot, ass, igst, cgst, ces, ass + igst + 2 * cgst + ces + oth)
+        )
+        ass_val += ass
+        igst_val += igst
+        gst_val += cgst
+        ces_val += ces
+        oth_val += oth
+
+    item_list = []
+    for i, (tot, ass, igst, cgst, ces, total) in enumerate(computed):
+        item = {key: column[i] for key, column in given}
+        item["TotAmt"] = tot / 100
+        item["AssAmt"] = ass / 100
+        item["IgstAmt"] = igst / 100
+        item["CgstAmt"] = item["SgstAmt"] = cgst / 100
+        if ces_rt is not None:
+            item["CesAmt"] = ces / 100
+        item["TotItemVal"] = total / 100
+        item_list.append(item)
+
+    tot_inv_val = ass_val + igst_val + 2 * gst_val + ces_val + oth_val
+    val_dtls = dict(
+        ass_val=ass_val / 100,
+        cgst_val=gst_val / 100,
+        sgst_val=gst_val / 100,
+        igst_val=igst_val / 100,
+    )
+    if ces_rt is not None:
+        val_dtls["ces_val"] = ces_val / 100
+    if oth_chrg is not None:
+        val_dtls["oth_chrg"] = oth_val / 100
+    if round_off:
+        rounded = _div_round(tot_inv_val, 100) * 100
+        val_dtls["rnd_off_amt"] = (rounded - tot_inv_val) / 100
+        tot_inv_val = rounded
+    val_dtls["tot_inv_val"] = tot_inv_val / 100
+    return item_list, get_val_dtls(**val_dtls)
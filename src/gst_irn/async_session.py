@@ -0,0 +1,408 @@
+import asyncio
+import logging
+from functools import partial
+
+import httpx
+
+from .session import (
+    DEFAULT_TIMEOUT,
+    AuthTokenError,
+    BaseSession,
+    RequestError,
+    ServerError,
+    _check_invoice,
+    _get_auth_request,
+    _get_cancel_payload,
+    _get_data_from_response,
+    _get_doc_details_url,
+    _get_duplicate_irn,
+    _get_encrypted_payload,
+    _get_ewaybill_payload,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_async_http_client(
+    max_connections=100, connect_retries=3, timeout=DEFAULT_TIMEOUT
+):
+    """
+    creates a pooled async http client which keeps connections alive
+
+    the same client can be passed to multiple `AsyncSession` objects so that
+    they share the underlying connections. only connection failures are
+    retried.
+    """
+    connect_timeout, read_timeout = timeout
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+    )
+    transport = httpx.AsyncHTTPTransport(
+        limits=limits, retries=connect_retries
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+    )
+
+
+class AsyncSession(BaseSession):
+    """
+    asyncio version of `Session`. all the request methods are coroutines.
+
+    `max_concurrency` limits the number of requests in flight at a time.
+    """
+
+    def __init__(
+        self,
+        gstin,
+        client_id,
+        client_secret,
+        username,
+        password,
+        public_key,
+        base_url="https://einv-apisandbox.nic.in",
+        gsp_headers=None,
+        token_store=None,
+        gst_info_cache=None,
+        rate_limiter=None,
+        retries=0,
+        backoff_factor=0.5,
+        http_client=None,
+        timeout=DEFAULT_TIMEOUT,
+        max_connections=100,
+        connect_retries=3,
+        max_concurrency=100,
+        json_codec=None,
+        listeners=None,
+        ledger=None,
+    ):
+        super().__init__(
+            gstin,
+            client_id,
+            client_secret,
+            username,
+            password,
+            public_key,
+            base_url=base_url,
+            gsp_headers=gsp_headers,
+            token_store=token_store,
+            gst_info_cache=gst_info_cache,
+            rate_limiter=rate_limiter,
+            retries=retries,
+            backoff_factor=backoff_factor,
+            json_codec=json_codec,
+            listeners=listeners,
+            ledger=ledger,
+        )
+
+        self._owns_http = http_client is None
+        if http_client is None:
+            http_client = get_async_http_client(
+                max_connections=max_connections,
+                connect_retries=connect_retries,
+                timeout=timeout,
+            )
+        self._http = http_client
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._token_lock = None
+
+    def _get_semaphore(self):
+        # created lazily so that it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    def _get_token_lock(self):
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        return self._token_lock
+
+    async def aclose(self):
+        """
+        closes the pooled connections, unless they were passed by the caller
+        """
+        if self._owns_http:
+            await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def generate_token(
+        self, force_regenerate_token=False, cache_dir="tokens_cache"
+    ):
+        self._cache_dir = cache_dir
+        await self._generate_token(force_regenerate_token, self._auth_token)
+
+    async def _generate_token(self, force, previous):
+        """
+        generates the token, force regenerating replaces `previous` token
+        """
+        timer = self._start_timer()
+        if not force and self._has_usable_token():
+            self._emit_token("memory", timer)
+            return
+
+        token_store = self._get_token_store(self._cache_dir)
+        cache_key = self._cache_key
+
+        stored_token = token_store.get(cache_key)
+        if self._use_stored_token(stored_token, force, previous):
+            self._emit_token("store", timer)
+            return
+
+        # only one coroutine of this session waits for the store lock
+        async with self._get_token_lock():
+            if self._auth_token != previous:
+                self._emit_token("memory", timer)
+                return
+
+            # the store lock blocks, so wait for it outside the event loop
+            lock = token_store.lock(cache_key)
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, lock.acquire)
+            try:
+                stored_token = token_store.get(cache_key)
+                if self._use_stored_token(stored_token, force, previous):
+                    self._emit_token("store", timer)
+                    return
+                data, app_key = await self._get_auth_token(force)
+                self._set_token(data, app_key, token_store)
+            finally:
+                lock.release()
+        self._emit_token("auth", timer)
+
+    async def _get_auth_token(self, force):
+        timer = self._start_timer()
+        url, payload, headers, app_key = _get_auth_request(self, force, timer)
+        response = error = None
+        try:
+            await self._wait_for_rate_limit(url)
+            timer.mark("rate_limit")
+            async with self._get_semaphore():
+                response = await self._http.post(
+                    url, content=payload, headers=headers
+                )
+            timer.mark("network")
+            self._update_rate_limit(url, response)
+            data = _get_data_from_response(
+                response, crypto_context=None, codec=self._codec, timer=timer
+            )
+        except Exception as err:
+            error = err
+            raise
+        finally:
+            self._emit_request(timer, "POST", url, payload, response, error)
+        return data, app_key
+
+    async def _wait_for_rate_limit(self, url):
+        wait = self._reserve_rate_limit(url)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _send(self, method, url, data, headers_extra, raw):
+        timer = self._start_timer()
+        headers = self._get_request_headers()
+        if headers_extra:
+            headers.update(headers_extra)
+
+        crypto_context = self._get_crypto()
+        payload = None
+        if method != "GET":
+            payload = _get_encrypted_payload(
+                data, crypto_context, self._codec, timer
+            )
+            headers["Content-Type"] = "application/json"
+
+        response = error = None
+        try:
+            await self._wait_for_rate_limit(url)
+            timer.mark("rate_limit")
+            async with self._get_semaphore():
+                response = await self._http.request(
+                    method, url, content=payload, headers=headers
+                )
+            timer.mark("network")
+            self._update_rate_limit(url, response)
+            return _get_data_from_response(
+                response,
+                crypto_context=crypto_context,
+                codec=self._codec,
+                raw=raw,
+                timer=timer,
+            )
+        except Exception as err:
+            error = err
+            raise
+        finally:
+            self._emit_request(timer, method, url, payload, response, error)
+
+    async def _send_with_retries(
+        self, method, url, data, headers_extra, replay, raw
+    ):
+        """
+        sends the request, retrying network and server errors with backoff
+
+        if a retried request fails because the first attempt had succeeded,
+        `replay` is called with the error response to resolve the result.
+        """
+        attempt = 0
+        while True:
+            try:
+                return await self._send(method, url, data, headers_extra, raw)
+            except (httpx.TransportError, ServerError) as err:
+                if attempt >= self._retries:
+                    raise
+                await asyncio.sleep(self._get_retry_delay(attempt, err))
+                attempt += 1
+            except RequestError as err:
+                if attempt == 0 or replay is None:
+                    raise
+                return await replay(err.args[1], err)
+
+    async def _request(
+        self,
+        method,
+        url,
+        data=None,
+        headers_extra=None,
+        replay=None,
+        raw=False,
+    ):
+        """
+        sends the request, regenerating the token once if it has expired
+        """
+        auth_token = self._auth_token
+        args = (method, url, data, headers_extra, replay, raw)
+        try:
+            return await self._send_with_retries(*args)
+        except AuthTokenError:
+            if auth_token is None:
+                raise
+            # some other request may have regenerated the token already
+            if self._auth_token == auth_token:
+                logger.info("auth token rejected, regenerating")
+                await self._generate_token(True, auth_token)
+            return await self._send_with_retries(*args)
+
+    async def get(self, url, headers_extra=None, raw=False):
+        """
+        sends get request to the given url along with authentication headers
+        returns decrypted response, as bytes if raw is True
+        """
+        return await self._request(
+            "GET", url, headers_extra=headers_extra, raw=raw
+        )
+
+    async def post(self, url, data, headers_extra=None, raw=False):
+        """
+        sends post request to the given url
+        - adds authentication headers
+        - encrypts the payload
+
+        returns decrypted response, as bytes if raw is True
+        """
+        return await self._request(
+            "POST", url, data, headers_extra=headers_extra, raw=raw
+        )
+
+    async def get_gst_info(self, party_gstin):
+        """
+        fetches and returns info for the given gst number
+
+        the info is reused from `gst_info_cache` of the session, if any
+        """
+        cache = self._gst_info_cache
+        if cache is not None:
+            gst_info = cache.get(party_gstin)
+            if gst_info is not None:
+                return gst_info
+
+        url = f"{self.base_url}/eivital/v1.04/Master/gstin/{party_gstin}"
+        gst_info = await self.get(url)
+        if cache is not None:
+            cache.set(party_gstin, gst_info)
+        return gst_info
+
+    async def generate_e_invoice(self, invoice, raw=False, validate=False):
+        """
+        generates and returns e-invoice for given invoice
+
+        e-invoice contains IRN, QR-code and signature. with raw=True the
+        decrypted JSON is returned as bytes. with validate=True the invoice
+        is validated locally first, raising `ValidationError` if invalid.
+        """
+        if validate:
+            _check_invoice(invoice)
+        e_invoice = self._get_saved_e_invoice(invoice, raw)
+        if e_invoice is not None:
+            return e_invoice
+        url = f"{self.base_url}/eicore/v1.03/Invoice"
+        replay = partial(self._replay_irn, raw=raw)
+        e_invoice = await self._request(
+            "POST", url, invoice, replay=replay, raw=raw
+        )
+        self._save_e_invoice(invoice, e_invoice)
+        return e_invoice
+
+    async def _replay_irn(self, response, err, raw=False):
+        """
+        returns the e-invoice generated by an earlier attempt of a retried
+        request, instead of the duplicate IRN error
+        """
+        irn = _get_duplicate_irn(response)
+        if irn is None:
+            raise err
+        logger.info("IRN %s was generated by an earlier attempt", irn)
+        return await self.get_e_invoice_by_irn(irn, raw=raw)
+
+    async def get_e_invoice_by_irn(self, irn, sup_gstin=None, raw=False):
+        """
+        returns e-invoice for an already generated irn
+        """
+        e_invoice = self._find_in_ledger(raw, irn=irn)
+        if e_invoice is not None:
+            return e_invoice
+        url = f"{self.base_url}/eicore/v1.03/Invoice/irn/{irn}"
+        return await self.get(url, raw=raw)
+
+    async def get_irn_by_doc_details(
+        self, doc_type, doc_no, doc_date, raw=False
+    ):
+        """
+        returns e-invoice generated for the document of the session's GSTIN
+        """
+        doc_details = (doc_type, doc_no, doc_date)
+        e_invoice = self._find_in_ledger(raw, doc_details=doc_details)
+        if e_invoice is not None:
+            return e_invoice
+        url = _get_doc_details_url(self.base_url, doc_type, doc_no, doc_date)
+        return await self.get(url, raw=raw)
+
+    async def cancel_e_invoice(self, irn, reason, remarks, raw=False):
+        """
+        cancels the e-invoice, returns its `Irn` and `CancelDate`
+        """
+        url = f"{self.base_url}/eicore/v1.03/Invoice/Cancel"
+        data = _get_cancel_payload(irn, reason, remarks)
+        cancelled = await self.post(url, data, raw=raw)
+        self._remove_from_ledger(irn)
+        return cancelled
+
+    async def generate_ewaybill_by_irn(
+        self, irn, distance, raw=False, **kwargs
+    ):
+        """
+        generates e-way bill of the e-invoice, returns `EwbNo`, `EwbDt` and
+        `EwbValidTill`
+        """
+        url = f"{self.base_url}/eiewb/v1.03/ewaybill"
+        data = _get_ewaybill_payload(irn, distance, kwargs)
+        ewaybill = await self.post(url, data, raw=raw)
+        self._save_ewaybill(irn, ewaybill)
+        return ewaybill
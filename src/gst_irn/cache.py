@@ -0,0 +1,108 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    thread-safe LRU cache whose entries expire after `ttl` seconds
+    """
+
+    def __init__(self, maxsize=4096, ttl=24 * 60 * 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        returns the cached value, None if missing or expired
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, stored_at=None):
+        if stored_at is None:
+            stored_at = time.time()
+        with self._lock:
+            self._data[key] = (value, stored_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteTTLCache(TTLCache):
+    """
+    TTLCache which also saves the entries in a SQLite database, so that they
+    survive restarts. values must be JSON serializable.
+    """
+
+    def __init__(self, path, maxsize=4096, ttl=24 * 60 * 60):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.path = str(path)
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn_lock = threading.Lock()
+        with self._conn_lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT, stored_at REAL"
+                ")"
+            )
+
+    def get(self, key):
+        value = super().get(key)
+        if value is not None:
+            return value
+
+        with self._conn_lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        value = json.loads(row[0])
+        super().set(key, value, stored_at=row[1])
+        return value
+
+    def set(self, key, value, stored_at=None):
+        if stored_at is None:
+            stored_at = time.time()
+        super().set(key, value, stored_at=stored_at)
+        with self._conn_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at) "
+                "VALUES (?, ?, ?)",
+                (key, json.dumps(value), stored_at),
+            )
+
+    def purge(self):
+        """
+        deletes the expired entries from the database
+        """
+        with self._conn_lock:
+            self._conn.execute(
+                "DELETE FROM cache WHERE stored_at < ?",
+                (time.time() - self.ttl,),
+            )
+
+    def close(self):
+        with self._conn_lock:
+            self._conn.close()
@@ -0,0 +1,292 @@
+"""
+command line interface of the library
+
+    gst-irn bulk invoices.jsonl --output results.jsonl
+
+the credentials are read from environment variables, named as in .env.sample
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from itertools import groupby, islice
+from pathlib import Path
+
+from . import generators
+from .session import Session
+
+# sections of the CSV header, like `seller_dtls.gstin` or `item.hsn_cd`
+_SECTIONS = {
+    "tran_dtls": generators.get_tran_dtls,
+    "doc_dtls": generators.get_doc_dtls,
+    "seller_dtls": generators.get_seller_dtls,
+    "buyer_dtls": generators.get_buyer_dtls,
+    "disp_dtls": generators.get_disp_dtls,
+    "ship_dtls": generators.get_ship_dtls,
+    "val_dtls": generators.get_val_dtls,
+    "pay_dtls": generators.get_pay_dtls,
+    "ewb_dtls": generators.get_ewb_dtls,
+}
+
+# fields which remain strings even if they look like numbers
+_TEXT_FIELDS = {
+    "gstin",
+    "ecm_gstin",
+    "no",
+    "dt",
+    "typ",
+    "stcd",
+    "pos",
+    "sl_no",
+    "hsn_cd",
+    "barcde",
+    "ph",
+    "trans_id",
+    "trans_mode",
+    "trans_doc_no",
+    "trans_doc_dt",
+    "veh_no",
+    "acct_det",
+}
+
+_NUMBER = re.compile(r"^-?\d+(\.\d+)?$")
+
+_CREDENTIALS = {
+    "gstin": "GSTIN",
+    "client_id": "CLIENT_ID",
+    "client_secret": "CLIENT_SECRET",
+    "username": "API_USERNAME",
+    "password": "API_PASSWORD",
+    "public_key": "PUBLIC_KEY",
+}
+
+
+def _to_value(field, value):
+    if field not in _TEXT_FIELDS and _NUMBER.match(value):
+        return float(value) if "." in value else int(value)
+    return value
+
+
+def _parse_row(row):
+    """
+    splits a CSV row into {section: {field: value}}, skipping empty cells
+    """
+    sections = {}
+    for column, value in row.items():
+        if value is None or value == "":
+            continue
+        section, _, field = column.strip().partition(".")
+        sections.setdefault(section, {})[field] = _to_value(field, value)
+    return sections
+
+
+def _to_invoice(rows):
+    """
+    builds an invoice from the parsed rows of a document, one row per item
+    """
+    first = rows[0]
+    kwargs = {
+        section: get(**first[section])
+        for section, get in _SECTIONS.items()
+        if section in first
+    }
+    kwargs.setdefault("tran_dtls", generators.get_tran_dtls())
+    item_list = [generators.get_item(**row["item"]) for row in rows]
+    return generators.get_invoice(item_list=item_list, **kwargs)
+
+
+def _get_doc_key(row):
+    return (
+        row.get("seller_dtls", {}).get("gstin"),
+        row["doc_dtls"]["typ"],
+        row["doc_dtls"]["no"],
+    )
+
+
+def read_csv_invoices(file):
+    """
+    yields invoices from a CSV file, one item per row
+
+    rows of an invoice must be consecutive. the columns are named as
+    `section.field` (like `doc_dtls.no` or `item.unit_price`) where section
+    is `item` or one of the `get_*` generators.
+    """
+    rows = (_parse_row(row) for row in csv.DictReader(file))
+    for _, doc_rows in groupby(rows, key=_get_doc_key):
+        yield _to_invoice(list(doc_rows))
+
+
+def read_jsonl_invoices(file):
+    """
+    yields invoices from a JSONL file, one invoice per line
+    """
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _read_checkpoint(path):
+    try:
+        return json.loads(Path(path).read_text())["completed"]
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(path, completed):
+    tmp_path = f"{path}.tmp"
+    Path(tmp_path).write_text(json.dumps({"completed": completed}))
+    os.replace(tmp_path, path)
+
+
+def _to_output(index, result):
+    doc_dtls = result.item.get("DocDtls", {})
+    output = {
+        "index": index,
+        "doc": {k: doc_dtls.get(k) for k in ("Typ", "No", "Dt")},
+    }
+    if result.error is None:
+        output["status"] = "ok"
+        output["data"] = result.data
+    else:
+        output["status"] = "error"
+        output["error"] = [
+            arg if isinstance(arg, (dict, list)) else str(arg)
+            for arg in result.error.args
+        ] or [repr(result.error)]
+    return output
+
+
+def _get_session(args):
+    credentials = {}
+    for name, variable in _CREDENTIALS.items():
+        if variable not in os.environ:
+            raise SystemExit(f"environment variable {variable} is not set")
+        credentials[name] = os.environ[variable]
+    return Session(
+        **credentials,
+        base_url=args.base_url,
+        pool_size=args.workers,
+        retries=args.retries,
+    )
+
+
+def bulk(args):
+    input_path = Path(args.input)
+    checkpoint = args.checkpoint or f"{args.output}.checkpoint"
+    completed = _read_checkpoint(checkpoint)
+
+    session = _get_session(args)
+    session.generate_token(cache_dir=args.cache_dir)
+
+    fmt = args.format or input_path.suffix.lstrip(".").lower()
+    read_invoices = read_csv_invoices if fmt == "csv" else read_jsonl_invoices
+    failed = 0
+    with open(input_path, newline="") as input_file, open(
+        args.output, "a"
+    ) as output_file:
+        # skip the invoices completed by an earlier run
+        invoices = islice(read_invoices(input_file), completed, None)
+        results = session.generate_e_invoices(
+            invoices,
+            max_workers=args.workers,
+            ordered=True,
+            validate=args.validate,
+        )
+        for index, result in enumerate(results, start=completed):
+            output_file.write(json.dumps(_to_output(index, result)) + "\n")
+            output_file.flush()
+            _write_checkpoint(checkpoint, index + 1)
+            failed += result.error is not None
+            completed = index + 1
+    session.close()
+    print(f"{completed} invoices processed, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def mock_irp(args):
+    # only needed for this command
+    from .mock_irp import MockIRP
+
+    irp = MockIRP(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+    if args.public_key_file:
+        Path(args.public_key_file).write_text(irp.public_key)
+    else:
+        print(irp.public_key, file=sys.stderr)
+    print(f"mock IRP running at {irp.url}", file=sys.stderr)
+    irp.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        irp.stop()
+    return 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="gst-irn")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bulk_parser = commands.add_parser(
+        "bulk", help="generate IRNs for invoices in a JSONL or CSV file"
+    )
+    bulk_parser.add_argument("input", help="JSONL or CSV file of invoices")
+    bulk_parser.add_argument(
+        "-o", "--output", required=True, help="JSONL file for the results"
+    )
+    bulk_parser.add_argument(
+        "--format", choices=["jsonl", "csv"], help="defaults to extension"
+    )
+    bulk_parser.add_argument(
+        "--checkpoint", help="defaults to <output>.checkpoint"
+    )
+    bulk_parser.add_argument("-w", "--workers", type=int, default=8)
+    bulk_parser.add_argument("--retries", type=int, default=3)
+    bulk_parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="validate invoices locally and skip sending the invalid ones",
+    )
+    bulk_parser.add_argument(
+        "--base-url", default="https://einv-apisandbox.nic.in"
+    )
+    bulk_parser.add_argument("--cache-dir", default="tokens_cache")
+    bulk_parser.set_defaults(func=bulk)
+
+    mock_parser = commands.add_parser(
+        "mock-irp", help="run a local IRP for testing"
+    )
+    mock_parser.add_argument("--host", default="127.0.0.1")
+    mock_parser.add_argument("--port", type=int, default=8000)
+    mock_parser.add_argument(
+        "--latency", type=float, default=0, help="seconds per request"
+    )
+    mock_parser.add_argument(
+        "--error-rate", type=float, default=0, help="fraction of HTTP 503"
+    )
+    mock_parser.add_argument(
+        "--rate-limit", type=int, help="requests per second per GSTIN"
+    )
+    mock_parser.add_argument(
+        "--public-key-file", help="file for the public key of the server"
+    )
+    mock_parser.set_defaults(func=mock_irp)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+JSON codecs for the request and response payloads
+
+a codec has `dumps(obj)` returning bytes and `loads(data)` accepting bytes or
+str. `get_codec()` picks orjson or msgspec when installed, else the standard
+json module.
+"""
+
+import json
+
+from . import models
+
+
+def _to_dict(value):
+    if isinstance(value, models.Node):
+        return value.to_dict()
+    raise TypeError(
+        f"Object of type {type(value).__name__} is not JSON serializable"
+    )
+
+
+class JSONCodec:
+    name = "json"
+
+    def dumps(self, obj):
+        return models.to_json_bytes(obj)
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+
+    def dumps(self, obj):
+        return self._dumps(obj, default=_to_dict)
+
+    def loads(self, data):
+        return self._loads(data)
+
+
+class MsgspecCodec:
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+
+        self._encoder = msgspec.json.Encoder(enc_hook=_to_dict)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj)
+
+    def loads(self, data):
+        return self._decoder.decode(data)
+
+
+CODECS = {
+    "json": JSONCodec,
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+}
+
+
+def get_codec(codec=None):
+    """
+    returns the codec of given name ("json", "orjson" or "msgspec")
+
+    the fastest installed codec is returned if codec is None. codec objects
+    are returned as they are.
+    """
+    if codec is None:
+        for name in ("orjson", "msgspec"):
+            try:
+                return CODECS[name]()
+            except ImportError:
+                continue
+        return JSONCodec()
+    if isinstance(codec, str):
+        return CODECS[codec]()
+    return codec
@@ -44,3 +44,11 @@ class States(Enum):
     OTHER_TERRITORY = "97"
     OTHER_COUNTRIES = "96"
     CENTRE_JURISDICTION = "99"
+
+
+@unique
+class CancelReasons(Enum):
+    DUPLICATE = "1"
+    DATA_ENTRY_MISTAKE = "2"
+    ORDER_CANCELLED = "3"
+    OTHERS = "4"
@@ -1,21 +1,52 @@
 import base64
-
-from cryptography.hazmat.primitives import padding as sym_padding
-from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from functools import lru_cache
 
 # specs for algorithms are available at:
 # https://einv-apisandbox.nic.in/FaqsonAPI.html
 
+# cryptography is slow to import, so it is imported by the functions using it
+
+
+def _get_aes_cipher(key):
+    """
+    returns AES-ECB cipher of the decoded key
+    """
+    from cryptography.hazmat.primitives.ciphers import (
+        Cipher,
+        algorithms,
+        modes,
+    )
+
+    return Cipher(algorithm=algorithms.AES(key=key), mode=modes.ECB())
+
+
+def _get_pkcs7():
+    from cryptography.hazmat.primitives import padding
+
+    return padding.PKCS7(128)
+
+
+@lru_cache(maxsize=16)
+def load_public_key(public_key_str):
+    """
+    parses the PEM public key. parsed keys are cached.
+    """
+    from cryptography.hazmat.primitives.serialization import (
+        load_pem_public_key,
+    )
+
+    return load_pem_public_key(public_key_str.encode())
+
 
 def encrypt_with_rsa_pub_key(message, public_key_str) -> str:
     """
     encrypt message with RSA by given public key
     """
-    public_key = load_pem_public_key(public_key_str.encode())
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    public_key = load_public_key(public_key_str)
     encrypted_msg = public_key.encrypt(
-        plaintext=message, padding=asym_padding.PKCS1v15()
+        plaintext=message, padding=padding.PKCS1v15()
     )
     encoded_encrypted_msg = base64.b64encode(encrypted_msg).decode()
     return encoded_encrypted_msg
@@ -27,13 +58,11 @@ def decrypt_with_aes(message, key, raw=False):
     """
     message = base64.b64decode(message)
     key = base64.b64decode(key)
-    decryptor = Cipher(
-        algorithm=algorithms.AES(key=key), mode=modes.ECB()
-    ).decryptor()
+    decryptor = _get_aes_cipher(key).decryptor()
     decrypted = decryptor.update(message) + decryptor.finalize()
 
     # remove padding with pkcs7
-    unpadder = sym_padding.PKCS7(128).unpadder()
+    unpadder = _get_pkcs7().unpadder()
     decrypted = unpadder.update(decrypted) + unpadder.finalize()
 
     # convert to string if not raw
@@ -47,12 +76,10 @@ def encrypt_with_aes(message, key) -> str:
     encrypts the message with the given secret key (SEK)
     """
     key = base64.b64decode(key)
-    encryptor = Cipher(
-        algorithm=algorithms.AES(key=key), mode=modes.ECB()
-    ).encryptor()
+    encryptor = _get_aes_cipher(key).encryptor()
 
     # pad the message with PKCS7
-    padder = sym_padding.PKCS7(128).padder()
+    padder = _get_pkcs7().padder()
     message = padder.update(message) + padder.finalize()
 
     # encrypt the message
@@ -61,3 +88,52 @@ def encrypt_with_aes(message, key) -> str:
     # base64 encode the message
     message = base64.b64encode(message).decode()
     return message
+
+
+class CryptoContext:
+    """
+    keeps the decoded secret key (SEK) and its AES cipher for reuse
+
+    the SEK remains same for the lifetime of an auth token. so a context is
+    created once per token instead of decoding the key for every request.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._cipher = _get_aes_cipher(base64.b64decode(key))
+        self._pkcs7 = _get_pkcs7()
+
+    def encrypt(self, message) -> str:
+        """
+        encrypts the message (bytes) with the SEK
+        """
+        encryptor = self._cipher.encryptor()
+
+        # pad the message with PKCS7
+        padder = self._pkcs7.padder()
+        message = padder.update(message) + padder.finalize()
+
+        message = encryptor.update(message) + encryptor.finalize()
+        return base64.b64encode(message).decode()
+
+    def decrypt(self, message, raw=False):
+        """
+        decrypts the base64 encoded message with the SEK
+        """
+        message = base64.b64decode(message)
+        decryptor = self._cipher.decryptor()
+        decrypted = decryptor.update(message) + decryptor.finalize()
+
+        # remove padding with pkcs7
+        unpadder = self._pkcs7.unpadder()
+        decrypted = unpadder.update(decrypted) + unpadder.finalize()
+
+        if not raw:
+            decrypted = decrypted.decode()
+        return decrypted
+
+    def encrypt_many(self, messages):
+        return [self.encrypt(message) for message in messages]
+
+    def decrypt_many(self, messages, raw=False):
+        return [self.decrypt(message, raw=raw) for message in messages]
@@ -1,21 +1,23 @@
-def _to_camel_case(name):
-    return "".join(word.title() for word in name.split("_"))
+"""
+helpers returning the invoice nodes as dicts, see `models` for the typed
+nodes
+"""
 
-
-def _to_camel_case_dict(**kwargs):
-    return {_to_camel_case(k): v for k, v in kwargs.items()}
+from . import models
 
 
 def get_tran_dtls(*, tax_sch="GST", sup_typ="B2B", **kwargs):
-    return _to_camel_case_dict(tax_sch=tax_sch, sup_typ=sup_typ, **kwargs)
+    return models.TranDtls(
+        tax_sch=tax_sch, sup_typ=sup_typ, **kwargs
+    ).to_dict()
 
 
 def get_doc_dtls(*, typ, no, dt, **kwargs):
-    return _to_camel_case_dict(typ=typ, no=no, dt=dt, **kwargs)
+    return models.DocDtls(typ=typ, no=no, dt=dt, **kwargs).to_dict()
 
 
 def get_seller_dtls(*, gstin, lgl_nm, addr1, loc, pin, stcd, **kwargs):
-    return _to_camel_case_dict(
+    return models.SellerDtls(
         gstin=gstin,
         lgl_nm=lgl_nm,
         addr1=addr1,
@@ -23,11 +25,11 @@ def get_seller_dtls(*, gstin, lgl_nm, addr1, loc, pin, stcd, **kwargs):
         pin=pin,
         stcd=stcd,
         **kwargs,
-    )
+    ).to_dict()
 
 
 def get_buyer_dtls(*, gstin, lgl_nm, pos, addr1, loc, pin, stcd, **kwargs):
-    return _to_camel_case_dict(
+    return models.BuyerDtls(
         gstin=gstin,
         lgl_nm=lgl_nm,
         pos=pos,
@@ -36,19 +38,19 @@ def get_buyer_dtls(*, gstin, lgl_nm, pos, addr1, loc, pin, stcd, **kwargs):
         pin=pin,
         stcd=stcd,
         **kwargs,
-    )
+    ).to_dict()
 
 
 def get_disp_dtls(*, nm, addr1, loc, pin, stcd, **kwargs):
-    return _to_camel_case_dict(
+    return models.DispDtls(
         nm=nm, addr1=addr1, loc=loc, pin=pin, stcd=stcd, **kwargs
-    )
+    ).to_dict()
 
 
 def get_ship_dtls(*, lgl_nm, addr1, loc, pin, stcd, **kwargs):
-    return _to_camel_case_dict(
+    return models.ShipDtls(
         lgl_nm=lgl_nm, addr1=addr1, loc=loc, pin=pin, stcd=stcd, **kwargs
-    )
+    ).to_dict()
 
 
 def get_item(
@@ -64,7 +66,7 @@ def get_item(
     tot_item_val,
     **kwargs,
 ):
-    return _to_camel_case_dict(
+    return models.Item(
         sl_no=sl_no,
         is_servc=is_servc,
         hsn_cd=hsn_cd,
@@ -75,23 +77,23 @@ def get_item(
         gst_rt=gst_rt,
         tot_item_val=tot_item_val,
         **kwargs,
-    )
+    ).to_dict()
 
 
 def get_bch_dtls(*, nm, **kwargs):
-    return _to_camel_case_dict(nm=nm, **kwargs)
+    return models.BchDtls(nm=nm, **kwargs).to_dict()
 
 
 def get_val_dtls(*, tot_inv_val, **kwargs):
-    return _to_camel_case_dict(tot_inv_val=tot_inv_val, **kwargs)
+    return models.ValDtls(tot_inv_val=tot_inv_val, **kwargs).to_dict()
 
 
 def get_pay_dtls(**kwargs):
-    return _to_camel_case_dict(**kwargs)
+    return models.PayDtls(**kwargs).to_dict()
 
 
 def get_ewb_dtls(*, distance, **kwargs):
-    return _to_camel_case_dict(distance=distance, **kwargs)
+    return models.EwbDtls(distance=distance, **kwargs).to_dict()
 
 
 def get_invoice(
@@ -105,7 +107,7 @@ def get_invoice(
     val_dtls,
     **kwargs,
 ):
-    return _to_camel_case_dict(
+    return models.Invoice(
         version=version,
         tran_dtls=tran_dtls,
         doc_dtls=doc_dtls,
@@ -114,4 +116,4 @@ def get_invoice(
         item_list=item_list,
         val_dtls=val_dtls,
         **kwargs,
-    )
+    ).to_dict()
@@ -0,0 +1,163 @@
+"""
+local ledger of the e-invoices generated by sessions
+
+    ledger = SQLiteLedger("e_invoices.sqlite3")
+    session = Session(..., ledger=ledger)
+
+every e-invoice generated by the session is saved in the ledger, indexed by
+its IRN and by its document (seller GSTIN, type, number and date). reprints
+(`get_e_invoice_by_irn`, `get_irn_by_doc_details`) are then answered from
+the ledger, and generating an e-invoice again for a saved document returns
+the saved one without calling the IRP.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from . import models
+
+_DOC_FIELDS = ("Typ", "No", "Dt")
+_DOC_NODE = ("typ", "no", "dt")
+
+
+def get_doc_details(invoice):
+    """
+    returns (type, number, date) of the document of the invoice (a dict or
+    `models.Invoice`), None if any of them is missing
+    """
+    if isinstance(invoice, models.Node):
+        doc = getattr(invoice, "doc_dtls", None)
+        if doc is None:
+            return None
+        if isinstance(doc, models.Node):
+            details = tuple(getattr(doc, name, None) for name in _DOC_NODE)
+        else:
+            details = tuple(doc.get(name) for name in _DOC_FIELDS)
+    else:
+        doc = invoice.get("DocDtls") or {}
+        details = tuple(doc.get(name) for name in _DOC_FIELDS)
+    if not all(details):
+        return None
+    return details
+
+
+def _get_doc_key(doc_details):
+    # the IRP matches document types and numbers ignoring the case
+    doc_type, doc_no, doc_date = doc_details
+    return str(doc_type).upper(), str(doc_no).upper(), str(doc_date)
+
+
+class SQLiteLedger:
+    """
+    e-invoices saved in a SQLite database, can be shared by sessions of
+    different GSTINs and by threads
+    """
+
+    def __init__(self, path="e_invoices.sqlite3"):
+        self.path = str(path)
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn_lock = threading.Lock()
+        with self._conn_lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS e_invoices ("
+                "irn TEXT PRIMARY KEY, gstin TEXT NOT NULL, "
+                "doc_type TEXT NOT NULL, doc_no TEXT NOT NULL, "
+                "doc_date TEXT NOT NULL, data TEXT NOT NULL, "
+                "created_at REAL"
+                ")"
+            )
+            self._conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS e_invoices_doc "
+                "ON e_invoices (gstin, doc_type, doc_no, doc_date)"
+            )
+
+    def add(self, gstin, doc_details, e_invoice):
+        """
+        saves the e-invoice (a dict or JSON bytes) of the document, given as
+        (type, number, date)
+        """
+        if isinstance(e_invoice, (bytes, str)):
+            data = _to_text(e_invoice)
+            irn = json.loads(data)["Irn"]
+        else:
+            data = json.dumps(e_invoice)
+            irn = e_invoice["Irn"]
+        doc_type, doc_no, doc_date = _get_doc_key(doc_details)
+        with self._conn_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO e_invoices "
+                "(irn, gstin, doc_type, doc_no, doc_date, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (irn, gstin, doc_type, doc_no, doc_date, data, time.time()),
+            )
+
+    def _get(self, where, params, raw):
+        with self._conn_lock:
+            row = self._conn.execute(
+                f"SELECT data FROM e_invoices WHERE {where}", params
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0].encode() if raw else json.loads(row[0])
+
+    def get_by_irn(self, gstin, irn, raw=False):
+        """
+        returns the saved e-invoice of the IRN, None if it isn't saved.
+        with raw=True it is returned as JSON bytes.
+        """
+        return self._get("gstin = ? AND irn = ?", (gstin, irn), raw)
+
+    def get_by_doc_details(self, gstin, doc_details, raw=False):
+        """
+        returns the saved e-invoice of the document, None if it isn't saved
+        """
+        return self._get(
+            "gstin = ? AND doc_type = ? AND doc_no = ? AND doc_date = ?",
+            (gstin,) + _get_doc_key(doc_details),
+            raw,
+        )
+
+    def update(self, gstin, irn, fields):
+        """
+        sets the fields (like EwbNo) of the saved e-invoice, if saved
+        """
+        with self._conn_lock:
+            row = self._conn.execute(
+                "SELECT data FROM e_invoices WHERE gstin = ? AND irn = ?",
+                (gstin, irn),
+            ).fetchone()
+            if row is None:
+                return
+            data = dict(json.loads(row[0]), **fields)
+            self._conn.execute(
+                "UPDATE e_invoices SET data = ? WHERE irn = ?",
+                (json.dumps(data), irn),
+            )
+
+    def remove(self, gstin, irn):
+        """
+        deletes the e-invoice from the ledger, like after cancelling it
+        """
+        with self._conn_lock:
+            self._conn.execute(
+                "DELETE FROM e_invoices WHERE gstin = ? AND irn = ?",
+                (gstin, irn),
+            )
+
+    def __len__(self):
+        with self._conn_lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM e_invoices"
+            ).fetchone()[0]
+
+    def close(self):
+        with self._conn_lock:
+            self._conn.close()
+
+
+def _to_text(value):
+    return value.decode() if isinstance(value, bytes) else value
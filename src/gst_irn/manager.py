@@ -0,0 +1,210 @@
+"""
+sessions of many GSTINs sharing connections, tokens and limits
+
+    manager = SessionManager(
+        credentials={
+            "09AAJCM7191E1Z5": dict(
+                client_id="...", client_secret="...",
+                username="...", password="...",
+            ),
+            ...
+        },
+        public_key=public_key,
+        max_concurrency=32,
+        max_concurrency_per_gstin=4,
+    )
+    # routed to the session of SellerDtls.Gstin
+    e_invoice = manager.generate_e_invoice(invoice)
+"""
+
+import threading
+from collections.abc import Mapping
+from functools import partial
+
+from . import crypto, models
+from .session import (
+    DEFAULT_TIMEOUT,
+    RequestError,
+    Session,
+    ValidationError,
+    _run_bulk,
+)
+from .token_store import FileTokenStore
+from .transport import RequestsTransport
+from .validation import FieldError
+
+
+class UnknownGSTINError(RequestError):
+    """
+    raised for a GSTIN which isn't in the credentials of the manager
+    """
+
+
+def _get_seller_gstin(invoice):
+    """
+    returns SellerDtls.Gstin of the invoice (a dict or `models.Invoice`)
+    """
+    if isinstance(invoice, models.Node):
+        seller = getattr(invoice, "seller_dtls", None)
+    else:
+        seller = invoice.get("SellerDtls")
+    if isinstance(seller, models.Node):
+        gstin = getattr(seller, "gstin", None)
+    else:
+        gstin = seller.get("Gstin") if seller else None
+    if not gstin:
+        error = FieldError("SellerDtls.Gstin", "is required")
+        raise ValidationError("invalid invoice", [error])
+    return gstin
+
+
+class SessionManager:
+    """
+    creates and keeps a `Session` for every GSTIN, on first use
+
+    `credentials` maps a GSTIN to a dict of `client_id`, `client_secret`,
+    `username` and `password` (and any other argument of `Session`, like
+    `gsp_headers`). it can also be a function returning the dict, or None for
+    unknown numbers. other keyword arguments are passed to every session.
+
+    the sessions share one transport (a pool of connections, or an HTTP/2
+    connection with `transport.HTTPXTransport`) and one token store. at most
+    `max_concurrency` requests are sent at a time, and at most
+    `max_concurrency_per_gstin` of them for the same GSTIN.
+    """
+
+    def __init__(
+        self,
+        credentials,
+        public_key,
+        max_concurrency=32,
+        max_concurrency_per_gstin=None,
+        http_session=None,
+        token_store=None,
+        connect_retries=3,
+        timeout=DEFAULT_TIMEOUT,
+        transport=None,
+        **session_kwargs,
+    ):
+        if isinstance(credentials, Mapping):
+            credentials = credentials.get
+        self._get_credentials = credentials
+        self.public_key = public_key
+
+        self._owns_transport = transport is None
+        if transport is None:
+            transport = RequestsTransport(
+                http_session,
+                pool_size=max_concurrency,
+                connect_retries=connect_retries,
+            )
+        self._transport = transport
+        self._token_store = token_store or FileTokenStore()
+        self._session_kwargs = dict(session_kwargs, timeout=timeout)
+
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_gstin = max_concurrency_per_gstin
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._gstin_semaphores = {}
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+        # parse the key once for all the sessions
+        crypto.load_public_key(public_key)
+
+    def get_session(self, gstin):
+        """
+        returns the session of the GSTIN with a usable token
+        """
+        session = self._sessions.get(gstin)
+        if session is None:
+            session = self._create_session(gstin)
+        session.generate_token()
+        return session
+
+    def _create_session(self, gstin):
+        with self._lock:
+            session = self._sessions.get(gstin)
+            if session is not None:
+                return session
+            credentials = self._get_credentials(gstin)
+            if not credentials:
+                raise UnknownGSTINError(f"no credentials for GSTIN {gstin}")
+            kwargs = dict(self._session_kwargs, **credentials)
+            session = Session(
+                gstin=gstin,
+                public_key=self.public_key,
+                transport=self._transport,
+                token_store=self._token_store,
+                **kwargs,
+            )
+            self._sessions[gstin] = session
+            if self.max_concurrency_per_gstin:
+                self._gstin_semaphores[gstin] = threading.BoundedSemaphore(
+                    self.max_concurrency_per_gstin
+                )
+            return session
+
+    def call(self, gstin, method, *args, **kwargs):
+        """
+        calls the method of the GSTIN's session (like "get_gst_info") within
+        the concurrency limits
+        """
+        session = self.get_session(gstin)
+        gstin_semaphore = self._gstin_semaphores.get(gstin)
+        # the GSTIN's slot is taken first, so that requests waiting for it
+        # don't hold the global slots
+        if gstin_semaphore is not None:
+            gstin_semaphore.acquire()
+        try:
+            with self._semaphore:
+                return getattr(session, method)(*args, **kwargs)
+        finally:
+            if gstin_semaphore is not None:
+                gstin_semaphore.release()
+
+    def generate_e_invoice(self, invoice, raw=False, validate=False):
+        """
+        generates the e-invoice using the session of the seller's GSTIN
+        """
+        gstin = _get_seller_gstin(invoice)
+        return self.call(
+            gstin, "generate_e_invoice", invoice, raw=raw, validate=validate
+        )
+
+    def generate_e_invoices(
+        self, invoices, max_workers=None, ordered=True, validate=False
+    ):
+        """
+        generates e-invoices of many sellers concurrently
+
+        yields a `BulkResult(item, data, error)` for every invoice. workers
+        default to `max_concurrency`.
+        """
+        func = partial(self.generate_e_invoice, validate=validate)
+        return _run_bulk(
+            func, invoices, max_workers or self.max_concurrency, ordered
+        )
+
+    def get_e_invoice_by_irn(self, gstin, irn, raw=False):
+        return self.call(gstin, "get_e_invoice_by_irn", irn, raw=raw)
+
+    def close(self):
+        """
+        closes the sessions and the shared connections, unless they were
+        passed by the caller
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+        if self._owns_transport:
+            self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,342 @@
+"""
+instrumentation of sessions
+
+listeners passed to a session (`listeners=[...]`) are called with a
+`RequestEvent` after every HTTP request, including auth requests and retries,
+and with a `TokenEvent` every time the session needs a token.
+
+    metrics = PrometheusMetrics()
+    session = Session(..., listeners=[metrics])
+    ...
+    print(metrics.render())  # text format served at /metrics
+"""
+
+import bisect
+import re
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+# stages of a request, in order. "network" includes the processing time of
+# the IRP, as the client can't tell them apart.
+STAGES = ("serialize", "encrypt", "rate_limit", "network", "decrypt", "parse")
+
+# timings is a dict of seconds spent in each stage, for the stages reached.
+# status is None if no response was received. error is the name of the
+# exception raised, error_code the comma separated IRP error codes.
+RequestEvent = namedtuple(
+    "RequestEvent",
+    [
+        "endpoint",
+        "method",
+        "status",
+        "error",
+        "error_code",
+        "request_bytes",
+        "response_bytes",
+        "timings",
+        "duration",
+    ],
+)
+
+# source is "memory" or "store" for tokens reused from the session or the
+# token store, "auth" for tokens generated by calling the auth API.
+TokenEvent = namedtuple("TokenEvent", ["source", "duration"])
+
+# upper bounds of histogram buckets in seconds
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+_VERSION = re.compile(r"v\d+(\.\d+)*")
+
+
+def get_endpoint(url):
+    """
+    returns the endpoint of the url for labelling, without the api version
+    and ids, like "auth", "master/gstin" or "invoice/irn"
+    """
+    segments = urlparse(url).path.lower().strip("/").split("/")
+    for i, segment in enumerate(segments):
+        if _VERSION.fullmatch(segment):
+            segments = segments[i + 1 :]
+            break
+    endpoint = []
+    for segment in segments:
+        # gst numbers, IRNs and other ids have digits
+        if any(char.isdigit() for char in segment):
+            break
+        endpoint.append(segment)
+    return "/".join(endpoint)
+
+
+class Listener:
+    """
+    base class for listeners of session events. methods are called from the
+    thread (or event loop) sending the request, so they should be quick.
+    """
+
+    def on_request(self, event):
+        pass
+
+    def on_token(self, event):
+        pass
+
+
+class Timer:
+    """
+    measures the stages of a request, each from the end of the previous one
+    """
+
+    __slots__ = ("started", "timings", "_last")
+
+    def __init__(self):
+        self.started = self._last = time.perf_counter()
+        self.timings = {}
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0) + now - self._last
+        self._last = now
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class NullTimer:
+    """
+    timer used when a session has no listeners
+    """
+
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n")
+        )
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """
+    thread-safe counter for every combination of label values
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class Histogram:
+    """
+    thread-safe histogram with cumulative buckets, like prometheus
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self._counts = {}
+        self._sums = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0
+            counts[index] += 1
+            self._sums[labels] += value
+
+    def get_count(self, labels=()):
+        return sum(self._counts.get(labels, ()))
+
+    def get_quantile(self, q, labels=()):
+        """
+        estimates the q-quantile (0.99 for p99) from the buckets, like
+        `histogram_quantile` of prometheus. None if nothing was observed.
+        """
+        with self._lock:
+            counts = list(self._counts.get(labels, ()))
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    # the +Inf bucket has no upper bound
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def collect(self):
+        with self._lock:
+            items = sorted(
+                (labels, list(counts), self._sums[labels])
+                for labels, counts in self._counts.items()
+            )
+        names = self.labels + ("le",)
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(names, labels + (_format_value(bound),)),
+                    cumulative,
+                )
+            formatted = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum", formatted, total
+            yield f"{self.name}_count", formatted, cumulative
+
+
+class PrometheusMetrics(Listener):
+    """
+    listener keeping prometheus style counters and histograms of requests
+
+    `render()` returns the metrics in the prometheus text format, to be
+    served at /metrics of the application. p50 / p99 latencies per endpoint
+    can be graphed with `histogram_quantile` on the duration histogram, or
+    estimated locally with `get_quantile`.
+    """
+
+    def __init__(self, prefix="gst_irn", buckets=None):
+        self.requests = Counter(
+            f"{prefix}_requests_total",
+            "HTTP requests sent, by response status",
+            ("endpoint", "method", "status"),
+        )
+        self.errors = Counter(
+            f"{prefix}_request_errors_total",
+            "failed requests, by IRP error code or exception",
+            ("endpoint", "error"),
+        )
+        self.duration = Histogram(
+            f"{prefix}_request_duration_seconds",
+            "total time taken by requests",
+            ("endpoint",),
+            buckets,
+        )
+        self.stages = Histogram(
+            f"{prefix}_request_stage_seconds",
+            "time taken by each stage of requests",
+            ("endpoint", "stage"),
+            buckets,
+        )
+        self.bytes = Counter(
+            f"{prefix}_request_bytes_total",
+            "bytes of request and response bodies",
+            ("endpoint", "direction"),
+        )
+        self.tokens = Counter(
+            f"{prefix}_tokens_total",
+            "tokens reused from memory or the store, or generated by auth",
+            ("source",),
+        )
+        self.metrics = [
+            self.requests,
+            self.errors,
+            self.duration,
+            self.stages,
+            self.bytes,
+            self.tokens,
+        ]
+
+    def on_request(self, event):
+        endpoint = event.endpoint
+        status = "none" if event.status is None else str(event.status)
+        self.requests.inc((endpoint, event.method, status))
+        if event.error_code:
+            for code in event.error_code.split(","):
+                self.errors.inc((endpoint, code))
+        elif event.error:
+            self.errors.inc((endpoint, event.error))
+        self.duration.observe((endpoint,), event.duration)
+        for stage, seconds in event.timings.items():
+            self.stages.observe((endpoint, stage), seconds)
+        self.bytes.inc((endpoint, "sent"), event.request_bytes)
+        self.bytes.inc((endpoint, "received"), event.response_bytes)
+
+    def on_token(self, event):
+        self.tokens.inc((event.source,))
+
+    def get_quantile(self, q, endpoint):
+        """
+        returns the estimated q-quantile of request duration of the endpoint
+        """
+        return self.duration.get_quantile(q, (endpoint,))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.collect():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,525 @@
+"""
+local stand-in for the IRP (Invoice Registration Portal)
+
+implements auth, GST info, generating, fetching and cancelling IRNs and
+generating e-way bills by IRN with the same encryption as the IRP, using a
+generated RSA key pair. it is meant for tests and load testing without
+sandbox credentials.
+
+    with MockIRP(latency=0.05) as irp:
+        session = Session(..., public_key=irp.public_key, base_url=irp.url)
+        session.generate_token()
+        session.generate_e_invoice(invoice)
+
+latency, failures and throttling can be configured to see how the client
+behaves under load.
+"""
+
+import base64
+import datetime as dt
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import jwt
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from . import crypto
+from .transport import Response, Transport
+from .validation import validate_invoice
+
+# error codes returned by the mock, same as the IRP where one exists
+INVALID_TOKEN_CODE = "1005"
+DUPLICATE_IRN_CODE = "2150"
+IRN_NOT_FOUND_CODE = "2283"
+INVALID_INVOICE_CODE = "2000"
+NOT_ACTIVE_CODE = "9999"
+EWB_EXISTS_CODE = "9998"
+
+_DATE_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@lru_cache(maxsize=1)
+def _get_private_key():
+    # generating a key takes a while, so all the servers of a process share
+    # the same key pair
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def _now():
+    return dt.datetime.now().strftime(_DATE_TIME_FORMAT)
+
+
+def _error(code, message, info=None):
+    body = {
+        "Status": 0,
+        "ErrorDetails": [{"ErrorCode": code, "ErrorMessage": message}],
+    }
+    if info is not None:
+        body["InfoDtls"] = info
+    return 200, body
+
+
+def _encode(response):
+    if isinstance(response, (dict, list)):
+        response = json.dumps(response)
+    return response.encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, which otherwise waits for
+    # delayed ACKs of keep-alive connections
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        status, response = self.server.irp.handle(
+            method, self.path, self.headers, body
+        )
+        if status is None:
+            # simulates a dropped connection
+            self.close_connection = True
+            return
+        response = _encode(response)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+
+class MockIRP:
+    """
+    local IRP server running in a background thread
+
+    - latency: seconds to wait before responding, or (min, max) for random
+      delays
+    - error_rate: fraction of requests failing with HTTP 503
+    - rate_limit: requests per second allowed per GSTIN, beyond which HTTP
+      429 is returned
+    - token_validity: seconds for which auth tokens are valid
+    - validate: rejects invalid invoices using `validation.validate_invoice`
+    - gst_info: {gstin: info} returned by the GST info API. info of other
+      numbers is made up.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0,
+        error_rate=0,
+        rate_limit=None,
+        token_validity=6 * 60 * 60,
+        validate=True,
+        gst_info=None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.token_validity = token_validity
+        self.validate = validate
+        self.gst_info = gst_info or {}
+
+        self.private_key = _get_private_key()
+        self.public_key = (
+            self.private_key.public_key()
+            .public_bytes(
+                serialization.Encoding.PEM,
+                serialization.PublicFormat.SubjectPublicKeyInfo,
+            )
+            .decode()
+        )
+
+        self.stats = {}
+        self._tokens = {}
+        self._user_tokens = {}
+        self._e_invoices = {}
+        self._irns = {}
+        self._ack_no = 100000000000000
+        self._ewb_no = 100000000000
+        self._windows = {}
+        self._failures = []
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.irp = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # shutdown waits for serve_forever, which runs only once started
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, count=1, status=503, after_commit=False):
+        """
+        fails the next `count` requests (other than auth) with `status`
+
+        with after_commit=True the request is processed first, as when the
+        response of a successful request is lost. status None drops the
+        connection without a response.
+        """
+        with self._lock:
+            self._failures.extend([(status, after_commit)] * count)
+
+    def expire_tokens(self):
+        """
+        expires all the auth tokens, requests fail with error 1005
+        """
+        with self._lock:
+            self._tokens.clear()
+            self._user_tokens.clear()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def _is_throttled(self, gstin):
+        if not self.rate_limit:
+            return False
+        second = int(time.monotonic())
+        with self._lock:
+            window, count = self._windows.get(gstin, (second, 0))
+            if window != second:
+                window, count = second, 0
+            self._windows[gstin] = (window, count + 1)
+        return count >= self.rate_limit
+
+    def _wait(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def _get_failure(self):
+        with self._lock:
+            if self._failures:
+                return self._failures.pop(0)
+        if self.error_rate and random.random() < self.error_rate:
+            return 503, False
+        return None
+
+    def handle(self, method, path, headers, body):
+        """
+        returns (status, response) for the request
+        """
+        self._wait()
+        url = urlparse(path)
+        gstin = headers.get("gstin")
+        if self._is_throttled(gstin):
+            self._count("throttled")
+            return 429, "Too many requests"
+
+        if method == "POST" and url.path.endswith("/eivital/v1.04/auth"):
+            self._count("auth")
+            return self._auth(headers, json.loads(body))
+
+        failure = self._get_failure()
+        if failure and not failure[1]:
+            self._count("failed")
+            return failure[0], "Service Unavailable"
+
+        response = self._route(method, url, headers, body)
+        if failure:
+            self._count("failed")
+            return failure[0], "Service Unavailable"
+        return response
+
+    def get_transport(self):
+        """
+        returns a transport calling the mock within the process, without
+        starting the server
+        """
+        return MockTransport(self)
+
+    def _route(self, method, url, headers, body):
+        token = self._tokens.get(headers.get("AuthToken"))
+        if token is None or token["expiry"] < time.time():
+            self._count("invalid_token")
+            return _error(INVALID_TOKEN_CODE, "Invalid Token")
+        context = token["crypto"]
+        if method == "POST":
+            data = json.loads(context.decrypt(json.loads(body)["Data"]))
+
+        path = url.path
+        match = re.search(r"/Master/gstin/(\w+)$", path)
+        if method == "GET" and match:
+            self._count("gst_info")
+            status, response = 200, self._get_gst_info(match.group(1))
+        elif method == "POST" and path.endswith("/eicore/v1.03/Invoice"):
+            self._count("generate")
+            status, response = self._generate(token["gstin"], data)
+        elif method == "POST" and path.endswith("/Invoice/Cancel"):
+            self._count("cancel")
+            status, response = self._cancel(data)
+        elif method == "POST" and path.endswith("/eiewb/v1.03/ewaybill"):
+            self._count("ewaybill")
+            status, response = self._generate_ewaybill(data)
+        elif method == "GET" and "/Invoice/irn/" in path:
+            self._count("get_irn")
+            status, response = self._get_e_invoice(path.rsplit("/", 1)[1])
+        elif method == "GET" and path.endswith("/Invoice/irnbydocdetails"):
+            self._count("get_irn_by_doc")
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            key = (
+                headers.get("gstin"),
+                query.get("doctype", "").upper(),
+                query.get("docnum", "").upper(),
+                query.get("docdate"),
+            )
+            status, response = self._get_e_invoice(self._irns.get(key))
+        else:
+            return 404, "Not Found"
+
+        if status == 200 and response["Status"] == 1:
+            data = json.dumps(response["Data"]).encode()
+            response["Data"] = context.encrypt(data)
+        return status, response
+
+    def _auth(self, headers, body):
+        encrypted = base64.b64decode(body["Data"])
+        payload = self.private_key.decrypt(encrypted, padding.PKCS1v15())
+        payload = json.loads(base64.b64decode(payload))
+
+        user = (headers.get("client-id"), payload["UserName"])
+        with self._lock:
+            token = self._tokens.get(self._user_tokens.get(user))
+            now = time.time()
+            if (
+                token is None
+                or token["expiry"] < now
+                or payload["ForceRefreshAccessToken"]
+            ):
+                sek = os.urandom(32)
+                token = {
+                    "token": base64.b64encode(os.urandom(18)).decode(),
+                    "sek": sek,
+                    "crypto": crypto.CryptoContext(
+                        base64.b64encode(sek).decode()
+                    ),
+                    "gstin": headers.get("gstin"),
+                    "expiry": now + self.token_validity,
+                }
+                self._tokens[token["token"]] = token
+                self._user_tokens[user] = token["token"]
+
+        expiry = dt.datetime.fromtimestamp(token["expiry"])
+        data = {
+            "ClientId": headers.get("client-id"),
+            "UserName": payload["UserName"],
+            "AuthToken": token["token"],
+            "Sek": crypto.encrypt_with_aes(token["sek"], payload["AppKey"]),
+            "TokenExpiry": expiry.strftime(_DATE_TIME_FORMAT),
+        }
+        return 200, {"Status": 1, "Data": data}
+
+    def _get_gst_info(self, gstin):
+        info = self.gst_info.get(gstin)
+        if info is None:
+            info = {
+                "Gstin": gstin,
+                "TradeName": f"TRADER {gstin[2:7]}",
+                "LegalName": f"TRADER {gstin[2:7]} PRIVATE LIMITED",
+                "AddrBnm": "BUILDING",
+                "AddrBno": "1",
+                "AddrFlno": "",
+                "AddrSt": "MAIN ROAD",
+                "AddrLoc": "LOCALITY",
+                "StateCode": int(gstin[:2]),
+                "AddrPncd": 110001,
+                "TxpType": "REG",
+                "Status": "ACT",
+                "BlkStatus": "U",
+                "DtReg": "2017-07-01",
+                "DtDReg": None,
+            }
+        return {"Status": 1, "Data": info}
+
+    def _sign(self, data):
+        return jwt.encode(
+            {"data": json.dumps(data), "iss": "NIC"},
+            self.private_key,
+            algorithm="RS256",
+        )
+
+    def _generate(self, gstin, invoice):
+        if self.validate:
+            errors = validate_invoice(invoice)
+            if errors:
+                message = "; ".join(f"{e.path} {e.message}" for e in errors)
+                return _error(INVALID_INVOICE_CODE, message)
+
+        seller_gstin = (invoice.get("SellerDtls") or {}).get("Gstin", gstin)
+        doc = invoice.get("DocDtls") or {}
+        key = (
+            seller_gstin,
+            str(doc.get("Typ", "")).upper(),
+            str(doc.get("No", "")).upper(),
+            doc.get("Dt"),
+        )
+        irn = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+        with self._lock:
+            existing = self._e_invoices.get(irn)
+            if existing is None:
+                self._ack_no += 1
+                ack_no = self._ack_no
+        if existing is not None:
+            info = [
+                {
+                    "InfCd": "DUPIRN",
+                    "Desc": {
+                        "AckNo": existing["AckNo"],
+                        "AckDt": existing["AckDt"],
+                        "Irn": irn,
+                    },
+                }
+            ]
+            return _error(DUPLICATE_IRN_CODE, "Duplicate IRN", info)
+
+        ack_dt = _now()
+        items = invoice.get("ItemList") or [{}]
+        qr_data = {
+            "SellerGstin": seller_gstin,
+            "BuyerGstin": (invoice.get("BuyerDtls") or {}).get("Gstin"),
+            "DocNo": doc.get("No"),
+            "DocTyp": doc.get("Typ"),
+            "DocDt": doc.get("Dt"),
+            "TotInvVal": (invoice.get("ValDtls") or {}).get("TotInvVal"),
+            "ItemCnt": len(items),
+            "MainHsnCode": items[0].get("HsnCd"),
+            "Irn": irn,
+            "IrnDt": ack_dt,
+        }
+        e_invoice = {
+            "AckNo": ack_no,
+            "AckDt": ack_dt,
+            "Irn": irn,
+            "SignedInvoice": self._sign(
+                dict(invoice, Irn=irn, AckNo=ack_no, AckDt=ack_dt)
+            ),
+            "SignedQRCode": self._sign(qr_data),
+            "Status": "ACT",
+            "EwbNo": None,
+            "EwbDt": None,
+            "EwbValidTill": None,
+            "Remarks": None,
+        }
+        with self._lock:
+            self._e_invoices[irn] = e_invoice
+            self._irns[key] = irn
+        return 200, {"Status": 1, "Data": e_invoice}
+
+    def _get_e_invoice(self, irn):
+        e_invoice = self._e_invoices.get(irn)
+        if e_invoice is None:
+            return _error(IRN_NOT_FOUND_CODE, "IRN details are not found")
+        return 200, {"Status": 1, "Data": e_invoice}
+
+    def _cancel(self, data):
+        irn = data.get("Irn")
+        with self._lock:
+            e_invoice = self._e_invoices.get(irn)
+            if e_invoice is None or e_invoice["Status"] != "ACT":
+                e_invoice = None
+            else:
+                e_invoice["Status"] = "CNL"
+        if e_invoice is None:
+            return _error(NOT_ACTIVE_CODE, "Invoice is not active")
+        return 200, {"Status": 1, "Data": {"Irn": irn, "CancelDate": _now()}}
+
+    def _generate_ewaybill(self, data):
+        if not data.get("Distance") and data.get("Distance") != 0:
+            return _error(INVALID_INVOICE_CODE, "Distance is required")
+        irn = data.get("Irn")
+        with self._lock:
+            e_invoice = self._e_invoices.get(irn)
+            if e_invoice is None or e_invoice["Status"] != "ACT":
+                error = NOT_ACTIVE_CODE, "Invoice is not active"
+            elif e_invoice["EwbNo"] is not None:
+                error = EWB_EXISTS_CODE, "E-way bill is already generated"
+            else:
+                error = None
+                self._ewb_no += 1
+                now = dt.datetime.now()
+                valid_till = now + dt.timedelta(days=1)
+                e_invoice.update(
+                    EwbNo=self._ewb_no,
+                    EwbDt=now.strftime(_DATE_TIME_FORMAT),
+                    EwbValidTill=valid_till.strftime(_DATE_TIME_FORMAT),
+                )
+        if error is not None:
+            return _error(*error)
+        ewaybill = {
+            "EwbNo": e_invoice["EwbNo"],
+            "EwbDt": e_invoice["EwbDt"],
+            "EwbValidTill": e_invoice["EwbValidTill"],
+            "Remarks": None,
+        }
+        return 200, {"Status": 1, "Data": ewaybill}
+
+
+class MockTransport(Transport):
+    """
+    transport sending the requests of a session to the mock IRP directly,
+    without HTTP. dropped connections raise `requests.ConnectionError`.
+
+        irp = MockIRP()
+        transport = irp.get_transport()
+        session = Session(..., base_url=irp.url, transport=transport)
+    """
+
+    def __init__(self, irp):
+        self.irp = irp
+
+    def request(self, method, url, data=None, headers=None, timeout=None):
+        status, response = self.irp.handle(
+            method, url, headers or {}, data or b""
+        )
+        if status is None:
+            raise requests.ConnectionError("connection dropped by mock IRP")
+        return Response(
+            status, _encode(response), {"Content-Type": "application/json"}
+        )
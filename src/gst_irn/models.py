@@ -0,0 +1,368 @@
+"""
+typed invoice nodes with slots
+
+the nodes serialize directly to compact JSON bytes, without building the
+intermediate dicts. `Session.post` accepts them in place of dicts.
+
+    invoice = Invoice(
+        doc_dtls=DocDtls(typ="inv", no="1", dt="12/09/2022"),
+        ...
+    )
+    session.generate_e_invoice(invoice)
+
+the `get_*` generators return the same structure as dicts.
+"""
+
+import json
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+
+
+def _default(value):
+    if isinstance(value, Node):
+        return value.to_dict()
+    raise TypeError(
+        f"Object of type {type(value).__name__} is not JSON serializable"
+    )
+
+
+_MISSING = object()
+
+_encode = json.JSONEncoder(separators=(",", ":"), default=_default).encode
+
+
+@lru_cache(maxsize=None)
+def to_camel_case(name):
+    return "".join(word.title() for word in name.split("_"))
+
+
+class Node:
+    """
+    base class of invoice nodes
+
+    subclasses list their fields in `__slots__` and the mandatory fields in
+    `_required`. fields not in the slots are kept in `_extra`.
+    """
+
+    __slots__ = ("_extra",)
+    _required = ()
+    _defaults = {}
+    _prefix_items = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = cls.__slots__
+        cls._field_set = frozenset(cls.__slots__)
+        # precomputed JSON key of every field
+        cls._keys = {name: to_camel_case(name) for name in cls.__slots__}
+        cls._prefix_items = tuple(
+            (name, encode_basestring_ascii(key) + ":")
+            for name, key in cls._keys.items()
+        )
+
+    def __init__(self, **kwargs):
+        for name in self._required:
+            if name not in kwargs:
+                raise TypeError(
+                    f"{type(self).__name__}() missing required argument: "
+                    f"'{name}'"
+                )
+        for name, default in self._defaults.items():
+            if name not in kwargs:
+                setattr(self, name, default)
+
+        extra = None
+        field_set = self._field_set
+        for name, value in kwargs.items():
+            if name in field_set:
+                setattr(self, name, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[to_camel_case(name)] = value
+        self._extra = extra
+
+    def _items(self):
+        """
+        yields (json key, value) of the fields that are set
+        """
+        for name in self._fields:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                yield self._keys[name], value
+        if self._extra:
+            yield from self._extra.items()
+
+    def to_dict(self):
+        """
+        returns the node as dict, same as the `get_*` generators
+        """
+        return {key: _to_dict_value(value) for key, value in self._items()}
+
+    def _dumps(self):
+        items = []
+        for name, prefix in self._prefix_items:
+            value = getattr(self, name, _MISSING)
+            if value is _MISSING:
+                continue
+            encode = _SCALARS.get(type(value))
+            if encode is None:
+                items.append(prefix + _dumps(value))
+            else:
+                items.append(prefix + encode(value))
+        if self._extra:
+            for key, value in self._extra.items():
+                items.append(
+                    encode_basestring_ascii(key) + ":" + _dumps(value)
+                )
+        return "{" + ",".join(items) + "}"
+
+    def to_json(self):
+        """
+        returns the node as compact JSON bytes
+        """
+        return self._dumps().encode()
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def _to_dict_value(value):
+    if isinstance(value, Node):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_dict_value(v) for v in value]
+    return value
+
+
+_INFINITY = (float("inf"), float("-inf"))
+
+
+def _float_repr(value):
+    if value != value or value in _INFINITY:
+        return _encode(value)
+    return float.__repr__(value)
+
+
+# encoders of the common scalars, same output as json.dumps
+_SCALARS = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    float: _float_repr,
+    bool: lambda value: "true" if value else "false",
+    type(None): lambda value: "null",
+}
+
+
+def _dumps(value):
+    encode = _SCALARS.get(type(value))
+    if encode is not None:
+        return encode(value)
+    if isinstance(value, Node):
+        return value._dumps()
+    if isinstance(value, list):
+        return "[" + ",".join(map(_dumps, value)) + "]"
+    return _encode(value)
+
+
+def to_json_bytes(data):
+    """
+    returns compact JSON bytes of a node, or of a dict / list which may
+    contain nodes
+    """
+    if isinstance(data, Node):
+        return data.to_json()
+    return _encode(data).encode()
+
+
+class TranDtls(Node):
+    __slots__ = ("tax_sch", "sup_typ", "reg_rev", "ecm_gstin", "igst_on_intra")
+    _defaults = {"tax_sch": "GST", "sup_typ": "B2B"}
+
+
+class DocDtls(Node):
+    __slots__ = ("typ", "no", "dt")
+    _required = ("typ", "no", "dt")
+
+
+class SellerDtls(Node):
+    __slots__ = (
+        "gstin",
+        "lgl_nm",
+        "trd_nm",
+        "addr1",
+        "addr2",
+        "loc",
+        "pin",
+        "stcd",
+        "ph",
+        "em",
+    )
+    _required = ("gstin", "lgl_nm", "addr1", "loc", "pin", "stcd")
+
+
+class BuyerDtls(Node):
+    __slots__ = (
+        "gstin",
+        "lgl_nm",
+        "trd_nm",
+        "pos",
+        "addr1",
+        "addr2",
+        "loc",
+        "pin",
+        "stcd",
+        "ph",
+        "em",
+    )
+    _required = ("gstin", "lgl_nm", "pos", "addr1", "loc", "pin", "stcd")
+
+
+class DispDtls(Node):
+    __slots__ = ("nm", "addr1", "addr2", "loc", "pin", "stcd")
+    _required = ("nm", "addr1", "loc", "pin", "stcd")
+
+
+class ShipDtls(Node):
+    __slots__ = (
+        "gstin",
+        "lgl_nm",
+        "trd_nm",
+        "addr1",
+        "addr2",
+        "loc",
+        "pin",
+        "stcd",
+    )
+    _required = ("lgl_nm", "addr1", "loc", "pin", "stcd")
+
+
+class BchDtls(Node):
+    __slots__ = ("nm", "exp_dt", "wr_dt")
+    _required = ("nm",)
+
+
+class Item(Node):
+    __slots__ = (
+        "sl_no",
+        "prd_desc",
+        "is_servc",
+        "hsn_cd",
+        "barcde",
+        "qty",
+        "free_qty",
+        "unit",
+        "unit_price",
+        "tot_amt",
+        "discount",
+        "pre_tax_val",
+        "ass_amt",
+        "gst_rt",
+        "igst_amt",
+        "cgst_amt",
+        "sgst_amt",
+        "ces_rt",
+        "ces_amt",
+        "ces_non_advl_amt",
+        "state_ces_rt",
+        "state_ces_amt",
+        "state_ces_non_advl_amt",
+        "oth_chrg",
+        "tot_item_val",
+        "ord_line_ref",
+        "org_cntry",
+        "prd_sl_no",
+        "bch_dtls",
+        "attrib_dtls",
+    )
+    _required = (
+        "sl_no",
+        "is_servc",
+        "hsn_cd",
+        "unit_price",
+        "igst_amt",
+        "tot_amt",
+        "ass_amt",
+        "gst_rt",
+        "tot_item_val",
+    )
+
+
+class ValDtls(Node):
+    __slots__ = (
+        "ass_val",
+        "cgst_val",
+        "sgst_val",
+        "igst_val",
+        "ces_val",
+        "st_ces_val",
+        "discount",
+        "oth_chrg",
+        "rnd_off_amt",
+        "tot_inv_val",
+        "tot_inv_val_fc",
+    )
+    _required = ("tot_inv_val",)
+
+
+class PayDtls(Node):
+    __slots__ = (
+        "nm",
+        "acc_det",
+        "mode",
+        "fin_ins_br",
+        "pay_term",
+        "pay_instr",
+        "cr_trn",
+        "dir_dr",
+        "cr_day",
+        "paid_amt",
+        "paymt_due",
+    )
+
+
+class EwbDtls(Node):
+    __slots__ = (
+        "trans_id",
+        "trans_name",
+        "trans_mode",
+        "distance",
+        "trans_doc_no",
+        "trans_doc_dt",
+        "veh_no",
+        "veh_type",
+    )
+    _required = ("distance",)
+
+
+class Invoice(Node):
+    __slots__ = (
+        "version",
+        "tran_dtls",
+        "doc_dtls",
+        "seller_dtls",
+        "buyer_dtls",
+        "disp_dtls",
+        "ship_dtls",
+        "item_list",
+        "val_dtls",
+        "pay_dtls",
+        "ref_dtls",
+        "addl_doc_dtls",
+        "exp_dtls",
+        "ewb_dtls",
+    )
+    _required = (
+        "tran_dtls",
+        "doc_dtls",
+        "seller_dtls",
+        "buyer_dtls",
+        "item_list",
+        "val_dtls",
+    )
+    _defaults = {"version": "1.1"}
@@ -1,7 +1,10 @@
 import base64
 from io import BytesIO
 
-import qrcode
+from .cache import TTLCache
+
+# rendered QR codes are kept in memory, so that reprints are free
+_cache = TTLCache(maxsize=1024, ttl=float("inf"))
 
 
 def _pil_to_base64(pil_img):
@@ -14,20 +17,136 @@ def _pil_to_base64(pil_img):
     return img.decode()
 
 
-def get_qr_code_image_base64(message):
+def _make_qr_code(message):
+    # qrcode (and PIL for PNG images) are slow to import, so imported here
+    import qrcode
+
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
     )
     qr.add_data(message)
     qr.make(fit=True)
+    return qr
+
+
+def _render_png_base64(message):
+    qr = _make_qr_code(message)
     img = qr.make_image(fill_color="black", back_color="white")
     return _pil_to_base64(img)
 
 
-def get_qr_code_image_html(message, pixels=250):
-    base64 = get_qr_code_image_base64(message)
+def get_qr_code_matrix(message):
+    """
+    returns the QR code as rows of booleans (True for dark modules)
+
+    the matrix includes the quiet zone (border) around the code
+    """
+    return _make_qr_code(message).get_matrix()
+
+
+def _matrix_to_svg(matrix):
+    size = len(matrix)
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            # draw continuous dark modules of a row as one rectangle
+            start = x
+            while x < size and row[x]:
+                x += 1
+            path.append(f"M{start},{y}h{x - start}v1h-{x - start}z")
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="white"/>'
+        f'<path d="{"".join(path)}" fill="black"/>'
+        "</svg>"
+    )
+
+
+def _render_svg(message):
+    return _matrix_to_svg(get_qr_code_matrix(message))
+
+
+_RENDERERS = {
+    "png": _render_png_base64,
+    "svg": _render_svg,
+}
+
+
+def _render(args):
+    format, message = args
+    return _RENDERERS[format](message)
+
 
+def _get_rendered(format, message):
+    key = (format, message)
+    rendered = _cache.get(key)
+    if rendered is None:
+        rendered = _render(key)
+        _cache.set(key, rendered)
+    return rendered
+
+
+def get_qr_code_image_base64(message):
+    return _get_rendered("png", message)
+
+
+def get_qr_code_svg(message):
+    """
+    returns the QR code as SVG. doesn't need PIL or PNG compression.
+    """
+    return _get_rendered("svg", message)
+
+
+def get_qr_code_svg_base64(message):
+    return base64.b64encode(get_qr_code_svg(message).encode()).decode()
+
+
+def get_qr_code_images(messages, format="png", max_workers=None, chunksize=64):
+    """
+    renders many QR codes across a pool of processes
+
+    returns a list with base64 encoded PNG (for format="png") or SVG (for
+    format="svg") of every message, in order. messages rendered earlier are
+    reused from the cache. small batches are rendered in this process.
+    """
+    messages = list(messages)
+    rendered = {}
+    missing = []
+    for message in dict.fromkeys(messages):
+        cached = _cache.get((format, message))
+        if cached is None:
+            missing.append((format, message))
+        else:
+            rendered[message] = cached
+
+    if len(missing) > chunksize:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            images = executor.map(_render, missing, chunksize=chunksize)
+            for key, image in zip(missing, images):
+                _cache.set(key, image)
+                rendered[key[1]] = image
+    else:
+        for key in missing:
+            rendered[key[1]] = _get_rendered(*key)
+    return [rendered[message] for message in messages]
+
+
+def get_qr_code_image_html(message, pixels=250, format="png"):
     pixels = int(pixels)
-    html = f'<img src="data:image/png;base64,{base64}" style="width: {pixels}px; height: auto">'
+    if format == "svg":
+        base64 = get_qr_code_svg_base64(message)
+        mime_type = "image/svg+xml"
+    else:
+        base64 = get_qr_code_image_base64(message)
+        mime_type = "image/png"
+
+    html = f'<img src="data:{mime_type};base64,{base64}" style="width: {pixels}px; height: auto">'
     return html
@@ -3,16 +3,41 @@ import datetime as dt
 import json
 import logging
 import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
 from hashlib import md5
+from itertools import islice
 from pathlib import Path
 from pprint import pformat
+from urllib.parse import urlencode
 
 import requests
 
 from . import crypto
+from . import models
+from .codec import JSONCodec, get_codec
+from .ledger import get_doc_details
+from .metrics import NULL_TIMER, RequestEvent, Timer, TokenEvent, get_endpoint
+from .throttle import get_backoff_delay, get_endpoint_family, is_throttled
+from .token_store import (
+    FileTokenStore,
+    get_token_expiry,
+    is_expiry_usable,
+    is_token_usable,
+)
+
+# get_http_session was defined here, it is still importable from here
+from .transport import RequestsTransport, get_http_session  # noqa: F401
+from .validation import validate_invoice
 
 logger = logging.getLogger(__name__)
 
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (10, 60)
+
 
 def _get_decrypted_sek(sek, app_key):
     decrypted_sek = crypto.decrypt_with_aes(sek, app_key, raw=True)
@@ -35,32 +60,157 @@ class RequestError(Exception):
     pass
 
 
+class AuthTokenError(RequestError):
+    """
+    raised when the auth token is rejected, usually because it has expired
+    """
+
+
+class ServerError(RequestError):
+    """
+    raised for throttled (429) and server error (5xx) responses, which can be
+    retried
+    """
+
+
+class ValidationError(RequestError):
+    """
+    raised before sending an invoice which fails the local validation. the
+    second argument is the list of `validation.FieldError`.
+    """
+
+
 class GenerateTokenError(Exception):
     pass
 
 
-def _raise_formatted_error(err, msg):
-    fmt_err = pformat(err, indent=4)
-    logger.error(fmt_err)
-    raise RequestError(msg, err)
+_JSON_CODEC = JSONCodec()
+
+# error codes returned by the IRP for an invalid or expired auth token
+AUTH_ERROR_CODES = {"1005"}
+
+# error codes returned by the IRP for an already generated IRN
+DUPLICATE_IRN_CODES = {"2150"}
+
+# fields of the e-invoice set by generating its e-way bill
+EWAYBILL_FIELDS = ("EwbNo", "EwbDt", "EwbValidTill")
+
+
+def _get_error_codes(response):
+    """
+    returns the set of error codes in a failed response
+    """
+    if not isinstance(response, dict):
+        return set()
+    details = response.get("ErrorDetails") or []
+    return {
+        str(detail.get("ErrorCode"))
+        for detail in details
+        if isinstance(detail, dict)
+    }
+
+
+def _get_duplicate_irn(response):
+    """
+    returns the existing IRN from a duplicate IRN response, None otherwise
+    """
+    if not _get_error_codes(response) & DUPLICATE_IRN_CODES:
+        return None
+    for info in response.get("InfoDtls") or []:
+        desc = info.get("Desc") if isinstance(info, dict) else None
+        if isinstance(desc, dict) and desc.get("Irn"):
+            return desc["Irn"]
+    return None
+
+
+def _raise_formatted_error(err, msg, error_class=RequestError):
+    if logger.isEnabledFor(logging.ERROR):
+        fmt_err = pformat(err, indent=4)
+        logger.error(fmt_err)
+    raise error_class(msg, err)
 
 
-def _get_data_from_response(response, *, encryption_key):
+def _get_data_from_response(
+    response, *, crypto_context, codec=None, raw=False, timer=NULL_TIMER
+):
+    """
+    returns the (decrypted) data of a successful response, raises otherwise
+
+    with raw=True the decrypted data is returned as bytes, without parsing
+    """
     if response.status_code == 200:
-        response = response.json()
+        response = (codec or _JSON_CODEC).loads(response.content)
+        timer.mark("parse")
         if response["Status"] == 1:
             data = response["Data"]
-            if encryption_key:
-                data = crypto.decrypt_with_aes(data, encryption_key)
-                data = json.loads(data)
+            if crypto_context:
+                data = crypto_context.decrypt(data, raw=True)
+                timer.mark("decrypt")
+                if not raw:
+                    data = (codec or _JSON_CODEC).loads(data)
+                    timer.mark("parse")
             return data
+        elif _get_error_codes(response) & AUTH_ERROR_CODES:
+            _raise_formatted_error(response, "action failed", AuthTokenError)
         else:
             _raise_formatted_error(response, "action failed")
+    elif response.status_code == 401:
+        _raise_formatted_error(response.text, "status 401", AuthTokenError)
+    elif response.status_code == 429 or response.status_code >= 500:
+        _raise_formatted_error(
+            response.text, f"status {response.status_code}", ServerError
+        )
     else:
         _raise_formatted_error(response.text, f"status {response.status_code}")
 
 
-def _get_auth_token(session, force_regenerate_token):
+# result of a single item in bulk methods. exactly one of data / error is set
+BulkResult = namedtuple("BulkResult", ["item", "data", "error"])
+
+
+def _call_for_bulk(func, item):
+    try:
+        return BulkResult(item, func(item), None)
+    except (RequestError, requests.RequestException) as err:
+        return BulkResult(item, None, err)
+
+
+def _run_bulk(func, items, max_workers, ordered):
+    """
+    calls func for every item using a pool of threads and yields BulkResult
+
+    items are consumed lazily, so only a few items per worker are in memory at
+    any time. with ordered=False results are yielded as soon as they complete.
+    """
+    items = iter(items)
+    window = max_workers * 2
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit(count):
+            return [
+                executor.submit(_call_for_bulk, func, item)
+                for item in islice(items, count)
+            ]
+
+        if ordered:
+            pending = deque(submit(window))
+            while pending:
+                result = pending.popleft().result()
+                pending.extend(submit(1))
+                yield result
+        else:
+            pending = set(submit(window))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.update(submit(len(done)))
+                for future in done:
+                    yield future.result()
+
+
+def _get_auth_request(session, force_regenerate_token, timer=NULL_TIMER):
+    """
+    returns url, encrypted payload, headers and app_key for the auth request
+    """
     app_key = _get_app_key()
     url = f"{session.base_url}/eivital/v1.04/auth"
     # request headers
@@ -68,6 +218,7 @@ def _get_auth_token(session, force_regenerate_token):
         "client-id": session.client_id,
         "client-secret": session.client_secret,
         "gstin": session.gstin,
+        "Content-Type": "application/json",
     }
     if session.gsp_headers:
         headers.update(session.gsp_headers)
@@ -84,69 +235,108 @@ def _get_auth_token(session, force_regenerate_token):
 
     # base64 encoding of payload
     payload = base64.b64encode(payload.encode())
+    timer.mark("serialize")
 
     # encrypt using e-Invoice public Key
     payload = crypto.encrypt_with_rsa_pub_key(payload, session.public_key)
+    timer.mark("encrypt")
 
-    payload = {"Data": payload}
-    response = requests.post(url, json=payload, headers=headers)
+    payload = b'{"Data":"' + payload.encode() + b'"}'
+    return url, payload, headers, app_key
+
+
+def _get_auth_token(session, force_regenerate_token):
+    timer = session._start_timer()
+    url, payload, headers, app_key = _get_auth_request(
+        session, force_regenerate_token, timer
+    )
+    response = error = None
+    try:
+        wait = session._reserve_rate_limit(url)
+        if wait > 0:
+            time.sleep(wait)
+        timer.mark("rate_limit")
+        response = session._transport.request(
+            "POST",
+            url,
+            data=payload,
+            headers=headers,
+            timeout=session._timeout,
+        )
+        timer.mark("network")
+        session._update_rate_limit(url, response)
 
-    data = _get_data_from_response(response, encryption_key=None)
+        data = _get_data_from_response(
+            response, crypto_context=None, codec=session._codec, timer=timer
+        )
+    except Exception as err:
+        error = err
+        raise
+    finally:
+        session._emit_request(timer, "POST", url, payload, response, error)
     return data, app_key
 
 
-def _get_store_path(cache_dir, session):
-    # prepare dictionary of all session variables
-    attr_dict = {
-        a: getattr(session, a)
-        for a in dir(session)
-        if not a.startswith("_") and not callable(getattr(session, a))
-    }
+def _get_encrypted_payload(
+    data, crypto_context, codec=_JSON_CODEC, timer=NULL_TIMER
+):
+    """
+    returns the JSON body of a request, with the data encrypted
+    """
+    # convert payload to json bytes
+    payload = codec.dumps(data)
+    timer.mark("serialize")
 
-    # create a hash for session values
-    repr = json.dumps(attr_dict, sort_keys=True)
-    cache_key = md5(repr.encode()).hexdigest()
+    # encrypt payload
+    payload = crypto_context.encrypt(payload)
+    timer.mark("encrypt")
 
-    filename = f"{cache_key}.json"
-    store_path = Path(cache_dir) / filename
-    return store_path
+    # base64 needs no escaping, so the body is joined without encoding
+    return b'{"Data":"' + payload.encode() + b'"}'
 
 
-def _get_stored_token(cache_dir, session):
-    store_path = _get_store_path(cache_dir, session)
-    try:
-        stored_token = json.loads(store_path.read_text())
+def _call_with_kwargs(func, kwargs):
+    return func(**kwargs)
 
-        # check expiry
-        expiry = dt.datetime.strptime(
-            stored_token["expiry_time"], "%Y-%m-%d %H:%M:%S"
-        )
-        if expiry < (dt.datetime.now() + dt.timedelta(minutes=10)):
-            stored_token = None
 
-        # return tuple of token and sek
-        else:
-            stored_token = (stored_token["token"], stored_token["sek"])
-    except Exception:
-        stored_token = None
-    return stored_token
+def _get_cancel_payload(irn, reason, remarks):
+    # reason can be a `codes.CancelReasons` or its value
+    reason = getattr(reason, "value", reason)
+    return {"Irn": irn, "CnlRsn": str(reason), "CnlRem": remarks}
 
 
-def _store_token(cache_dir, session, expiry_time):
-    store_path = _get_store_path(cache_dir, session)
-    try:
-        store_path.parent.mkdir(parents=True, exist_ok=True)
-        obj = {
-            "token": session._auth_token,
-            "sek": session._auth_sek,
-            "expiry_time": expiry_time,
-        }
-        store_path.write_text(json.dumps(obj))
-    except Exception:
-        pass
+def _get_doc_details_url(base_url, doc_type, doc_no, doc_date):
+    query = urlencode(
+        {"doctype": doc_type, "docnum": doc_no, "docdate": doc_date}
+    )
+    return f"{base_url}/eicore/v1.03/Invoice/irnbydocdetails?{query}"
+
 
+def _get_ewaybill_payload(irn, distance, kwargs):
+    # same fields as EwbDtls of the invoice
+    payload = models.EwbDtls(distance=distance, **kwargs).to_dict()
+    return dict({"Irn": irn}, **payload)
+
+
+def _check_invoice(invoice):
+    errors = validate_invoice(invoice)
+    if errors:
+        raise ValidationError("invalid invoice", errors)
+
+
+def _get_cache_key(gstin, client_id, username, base_url):
+    """
+    returns the key under which the token of given credentials is stored
+    """
+    credentials = json.dumps([gstin, client_id, username, base_url])
+    return md5(credentials.encode()).hexdigest()
+
+
+class BaseSession:
+    """
+    credentials and token handling shared by `Session` and `AsyncSession`
+    """
 
-class Session:
     def __init__(
         self,
         gstin,
@@ -157,6 +347,14 @@ class Session:
         public_key,
         base_url="https://einv-apisandbox.nic.in",
         gsp_headers=None,
+        token_store=None,
+        gst_info_cache=None,
+        rate_limiter=None,
+        retries=0,
+        backoff_factor=0.5,
+        json_codec=None,
+        listeners=None,
+        ledger=None,
     ):
         self.gstin = gstin
         self.client_id = client_id
@@ -170,23 +368,190 @@ class Session:
 
         self._auth_token = None
         self._auth_sek = None
+        self._crypto = None
+        self._token_store = token_store
+        self._token_expiry = None
+        self._cache_key = _get_cache_key(gstin, client_id, username, base_url)
+        self._cache_dir = "tokens_cache"
+        self._gst_info_cache = gst_info_cache
+        self._rate_limiter = rate_limiter
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        self._codec = get_codec(json_codec)
+        self._listeners = list(listeners or ())
+        self._ledger = ledger
+
+    def _get_crypto(self):
+        """
+        returns the crypto context for the current SEK
+        """
+        if self._crypto is None or self._crypto.key != self._auth_sek:
+            self._crypto = crypto.CryptoContext(self._auth_sek)
+        return self._crypto
 
-    def generate_token(
-        self, force_regenerate_token=False, cache_dir="tokens_cache"
+    def _reserve_rate_limit(self, url):
+        """
+        returns the seconds to wait before sending a request to the url
+        """
+        if self._rate_limiter is None:
+            return 0
+        family = get_endpoint_family(url)
+        return self._rate_limiter.reserve(family, self.gstin)
+
+    def _update_rate_limit(self, url, response):
+        if self._rate_limiter is None:
+            return
+        family = get_endpoint_family(url)
+        throttled = is_throttled(response)
+        self._rate_limiter.update(family, self.gstin, throttled=throttled)
+
+    def _get_retry_delay(self, attempt, err):
+        """
+        returns seconds to wait before retrying after a failed attempt
+        """
+        delay = get_backoff_delay(attempt, self._backoff_factor)
+        logger.warning(
+            "request failed (%s), retrying in %.1f seconds", err, delay
+        )
+        return delay
+
+    def _start_timer(self):
+        """
+        returns a timer for the stages of a request, a no-op one if the
+        session has no listeners
+        """
+        return Timer() if self._listeners else NULL_TIMER
+
+    def _emit(self, name, event):
+        for listener in self._listeners:
+            try:
+                getattr(listener, name)(event)
+            except Exception:
+                logger.exception("session listener failed")
+
+    def _emit_request(self, timer, method, url, payload, response, error):
+        if timer is NULL_TIMER:
+            return
+        codes = set()
+        if isinstance(error, RequestError) and len(error.args) > 1:
+            codes = _get_error_codes(error.args[1])
+        event = RequestEvent(
+            endpoint=get_endpoint(url),
+            method=method,
+            status=None if response is None else response.status_code,
+            error=None if error is None else type(error).__name__,
+            error_code=",".join(sorted(codes)) or None,
+            request_bytes=len(payload) if payload else 0,
+            response_bytes=0 if response is None else len(response.content),
+            timings=timer.timings,
+            duration=timer.elapsed(),
+        )
+        self._emit("on_request", event)
+
+    def _emit_token(self, source, timer):
+        if timer is NULL_TIMER:
+            return
+        self._emit("on_token", TokenEvent(source, timer.elapsed()))
+
+    def _find_in_ledger(self, raw, irn=None, doc_details=None):
+        """
+        returns the e-invoice of the IRN or the document (type, number, date)
+        from the ledger, None if the session has no ledger or it isn't in it
+        """
+        if self._ledger is None:
+            return None
+        if irn is not None:
+            return self._ledger.get_by_irn(self.gstin, irn, raw=raw)
+        return self._ledger.get_by_doc_details(
+            self.gstin, doc_details, raw=raw
+        )
+
+    def _get_saved_e_invoice(self, invoice, raw):
+        """
+        returns the e-invoice generated earlier for the invoice's document,
+        if it is in the ledger
+        """
+        if self._ledger is None:
+            return None
+        doc_details = get_doc_details(invoice)
+        if doc_details is None:
+            return None
+        e_invoice = self._find_in_ledger(raw, doc_details=doc_details)
+        if e_invoice is not None:
+            logger.info(
+                "e-invoice of %s %s is in the ledger", *doc_details[:2]
+            )
+        return e_invoice
+
+    def _save_e_invoice(self, invoice, e_invoice):
+        if self._ledger is None:
+            return
+        doc_details = get_doc_details(invoice)
+        if doc_details is not None:
+            self._ledger.add(self.gstin, doc_details, e_invoice)
+
+    def _remove_from_ledger(self, irn):
+        if self._ledger is not None:
+            self._ledger.remove(self.gstin, irn)
+
+    def _save_ewaybill(self, irn, ewaybill):
+        if self._ledger is None:
+            return
+        if not isinstance(ewaybill, dict):
+            ewaybill = json.loads(ewaybill)
+        fields = {name: ewaybill.get(name) for name in EWAYBILL_FIELDS}
+        self._ledger.update(self.gstin, irn, fields)
+
+    def _get_token_store(self, cache_dir):
+        if self._token_store is None:
+            return FileTokenStore(cache_dir)
+        return self._token_store
+
+    def _use_stored_token(
+        self, stored_token, force_regenerate_token, previous
     ):
-        stored_token = _get_stored_token(cache_dir, self)
-        if stored_token and not force_regenerate_token:
-            self._auth_token, self._auth_sek = stored_token
-        else:
-            data, app_key = _get_auth_token(self, force_regenerate_token)
-            self._auth_token = data["AuthToken"]
-            self._auth_sek = _get_decrypted_sek(data["Sek"], app_key)
+        """
+        uses the stored token if possible, returns False if it isn't usable
+
+        while force regenerating, a stored token is used only if some other
+        session has already replaced the previous token.
+        """
+        if not is_token_usable(stored_token):
+            return False
+        if force_regenerate_token and (
+            previous is None or stored_token["token"] == previous
+        ):
+            return False
+        self._auth_token = stored_token["token"]
+        self._auth_sek = stored_token["sek"]
+        self._token_expiry = get_token_expiry(stored_token)
+        return True
+
+    def _has_usable_token(self):
+        """
+        checks the token held in memory, without reading the store
+        """
+        return self._auth_token is not None and is_expiry_usable(
+            self._token_expiry
+        )
+
+    def _set_token(self, data, app_key, token_store):
+        self._auth_token = data["AuthToken"]
+        self._auth_sek = _get_decrypted_sek(data["Sek"], app_key)
 
-            # cache token
-            expiry_time = data["TokenExpiry"]
-            _store_token(cache_dir, self, expiry_time)
+        # cache token
+        stored_token = {
+            "token": self._auth_token,
+            "sek": self._auth_sek,
+            "expiry_time": data["TokenExpiry"],
+        }
+        self._token_expiry = get_token_expiry(stored_token)
+        token_store.set(self._cache_key, stored_token)
 
     def _get_request_headers(self):
+        if not self._auth_sek:
+            raise GenerateTokenError()
+
         headers = {
             "client-id": self.client_id,
             "client-secret": self.client_secret,
@@ -198,65 +563,436 @@ class Session:
             headers.update(self.gsp_headers)
         return headers
 
-    def get(self, url, headers_extra=None):
+
+class Session(BaseSession):
+    def __init__(
+        self,
+        gstin,
+        client_id,
+        client_secret,
+        username,
+        password,
+        public_key,
+        base_url="https://einv-apisandbox.nic.in",
+        gsp_headers=None,
+        token_store=None,
+        gst_info_cache=None,
+        rate_limiter=None,
+        retries=0,
+        backoff_factor=0.5,
+        http_session=None,
+        timeout=DEFAULT_TIMEOUT,
+        pool_size=10,
+        connect_retries=3,
+        json_codec=None,
+        listeners=None,
+        ledger=None,
+        transport=None,
+    ):
+        super().__init__(
+            gstin,
+            client_id,
+            client_secret,
+            username,
+            password,
+            public_key,
+            base_url=base_url,
+            gsp_headers=gsp_headers,
+            token_store=token_store,
+            gst_info_cache=gst_info_cache,
+            rate_limiter=rate_limiter,
+            retries=retries,
+            backoff_factor=backoff_factor,
+            json_codec=json_codec,
+            listeners=listeners,
+            ledger=ledger,
+        )
+
+        # connections are pooled and kept alive across requests
+        self._owns_transport = transport is None
+        if transport is None:
+            transport = RequestsTransport(
+                http_session,
+                pool_size=pool_size,
+                connect_retries=connect_retries,
+            )
+        self._transport = transport
+        self._timeout = timeout
+
+        self._refresher = None
+        self._refresher_stop = None
+
+    def close(self):
         """
-        sends get request to the given url along with authentication headers
-        returns decrypted response
+        closes the pooled connections, unless they were passed by the caller
         """
-        if not self._auth_sek:
-            raise GenerateTokenError()
+        self.stop_token_refresher()
+        if self._owns_transport:
+            self._transport.close()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def generate_token(
+        self, force_regenerate_token=False, cache_dir="tokens_cache"
+    ):
+        self._cache_dir = cache_dir
+        self._generate_token(force_regenerate_token, self._auth_token)
+
+    def _generate_token(self, force, previous):
+        """
+        generates the token, force regenerating replaces `previous` token
+        """
+        timer = self._start_timer()
+        if not force and self._has_usable_token():
+            self._emit_token("memory", timer)
+            return
+
+        token_store = self._get_token_store(self._cache_dir)
+        cache_key = self._cache_key
+
+        stored_token = token_store.get(cache_key)
+        if self._use_stored_token(stored_token, force, previous):
+            self._emit_token("store", timer)
+            return
+
+        # only one session refreshes the token, others reuse it
+        with token_store.lock(cache_key):
+            stored_token = token_store.get(cache_key)
+            if self._use_stored_token(stored_token, force, previous):
+                self._emit_token("store", timer)
+                return
+            data, app_key = _get_auth_token(self, force)
+            self._set_token(data, app_key, token_store)
+        self._emit_token("auth", timer)
+
+    def start_token_refresher(
+        self,
+        refresh_before=dt.timedelta(minutes=15),
+        cache_dir="tokens_cache",
+        retry_interval=60,
+    ):
+        """
+        starts a background thread which regenerates the token before expiry
+
+        the token is regenerated `refresh_before` its expiry. failed attempts
+        are retried after `retry_interval` seconds.
+        """
+        if self._refresher is not None:
+            return
+        self._cache_dir = cache_dir
+        stop = threading.Event()
+        self._refresher = threading.Thread(
+            target=self._run_token_refresher,
+            args=(refresh_before, retry_interval, stop),
+            name="gst-irn-token-refresher",
+            daemon=True,
+        )
+        self._refresher_stop = stop
+        self._refresher.start()
+
+    def stop_token_refresher(self):
+        if self._refresher is None:
+            return
+        self._refresher_stop.set()
+        if self._refresher is not threading.current_thread():
+            self._refresher.join()
+        self._refresher = None
+
+    def _run_token_refresher(self, refresh_before, retry_interval, stop):
+        while True:
+            if self._token_expiry is None:
+                delay = 0
+            else:
+                refresh_at = self._token_expiry - refresh_before
+                delay = (refresh_at - dt.datetime.now()).total_seconds()
+            if stop.wait(max(delay, 0)):
+                return
+            try:
+                previous = self._auth_token
+                self._generate_token(previous is not None, previous)
+                delay = retry_interval if self._auth_token == previous else 0
+            except Exception:
+                logger.exception("could not regenerate auth token")
+                delay = retry_interval
+            if stop.wait(delay):
+                return
+
+    def _send(self, method, url, data, headers_extra, raw):
+        timer = self._start_timer()
         headers = self._get_request_headers()
         if headers_extra:
             headers.update(headers_extra)
 
-        response = requests.get(url, headers=headers)
-        return _get_data_from_response(response, encryption_key=self._auth_sek)
+        crypto_context = self._get_crypto()
+        payload = None
+        if method != "GET":
+            payload = _get_encrypted_payload(
+                data, crypto_context, self._codec, timer
+            )
+            headers["Content-Type"] = "application/json"
+
+        response = error = None
+        try:
+            wait = self._reserve_rate_limit(url)
+            if wait > 0:
+                time.sleep(wait)
+            timer.mark("rate_limit")
+            response = self._transport.request(
+                method,
+                url,
+                data=payload,
+                headers=headers,
+                timeout=self._timeout,
+            )
+            timer.mark("network")
+            self._update_rate_limit(url, response)
+            return _get_data_from_response(
+                response,
+                crypto_context=crypto_context,
+                codec=self._codec,
+                raw=raw,
+                timer=timer,
+            )
+        except Exception as err:
+            error = err
+            raise
+        finally:
+            self._emit_request(timer, method, url, payload, response, error)
+
+    def _send_with_retries(
+        self, method, url, data, headers_extra, replay, raw
+    ):
+        """
+        sends the request, retrying network and server errors with backoff
+
+        if a retried request fails because the first attempt had succeeded,
+        `replay` is called with the error response to resolve the result.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._send(method, url, data, headers_extra, raw)
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                ServerError,
+            ) as err:
+                if attempt >= self._retries:
+                    raise
+                time.sleep(self._get_retry_delay(attempt, err))
+                attempt += 1
+            except RequestError as err:
+                if attempt == 0 or replay is None:
+                    raise
+                return replay(err.args[1], err)
+
+    def _request(
+        self,
+        method,
+        url,
+        data=None,
+        headers_extra=None,
+        replay=None,
+        raw=False,
+    ):
+        """
+        sends the request, regenerating the token once if it has expired
+        """
+        auth_token = self._auth_token
+        args = (method, url, data, headers_extra, replay, raw)
+        try:
+            return self._send_with_retries(*args)
+        except AuthTokenError:
+            if auth_token is None:
+                raise
+            # some other request may have regenerated the token already
+            if self._auth_token == auth_token:
+                logger.info("auth token rejected, regenerating")
+                self._generate_token(True, auth_token)
+            return self._send_with_retries(*args)
+
+    def get(self, url, headers_extra=None, raw=False):
+        """
+        sends get request to the given url along with authentication headers
+        returns decrypted response, as bytes if raw is True
+        """
+        return self._request("GET", url, headers_extra=headers_extra, raw=raw)
 
-    def post(self, url, data, headers_extra=None):
+    def post(self, url, data, headers_extra=None, raw=False):
         """
         sends post request to the given url
         - adds authentication headers
         - encrypts the payload
 
-        returns decrypted response
+        returns decrypted response, as bytes if raw is True
         """
-        if not self._auth_sek:
-            raise GenerateTokenError()
-
-        # convert payload to json string
-        data = json.dumps(data)
-        payload = data.encode()
-
-        # encrypt payload
-        payload = crypto.encrypt_with_aes(payload, self._auth_sek)
-        payload = {"Data": payload}
-        headers = self._get_request_headers()
-        if headers_extra:
-            headers.update(headers_extra)
-
-        response = requests.post(url, json=payload, headers=headers)
-        return _get_data_from_response(response, encryption_key=self._auth_sek)
+        return self._request(
+            "POST", url, data, headers_extra=headers_extra, raw=raw
+        )
 
     def get_gst_info(self, party_gstin):
         """
         fetches and returns info for the given gst number
+
+        the info is reused from `gst_info_cache` of the session, if any
         """
+        cache = self._gst_info_cache
+        if cache is not None:
+            gst_info = cache.get(party_gstin)
+            if gst_info is not None:
+                return gst_info
+
         url = f"{self.base_url}/eivital/v1.04/Master/gstin/{party_gstin}"
-        return self.get(url)
+        gst_info = self.get(url)
+        if cache is not None:
+            cache.set(party_gstin, gst_info)
+        return gst_info
 
-    def generate_e_invoice(self, invoice):
+    def prefetch_gst_info(self, gstins, max_workers=8):
+        """
+        fetches info of the given gst numbers concurrently into the cache
+
+        numbers already in the cache are skipped. returns the list of
+        `BulkResult` of the fetched numbers.
+        """
+        if self._gst_info_cache is None:
+            raise ValueError("prefetching needs a gst_info_cache")
+        missing = {
+            gstin for gstin in gstins if gstin not in self._gst_info_cache
+        }
+        results = _run_bulk(
+            self.get_gst_info, sorted(missing), max_workers, ordered=False
+        )
+        return list(results)
+
+    def generate_e_invoice(self, invoice, raw=False, validate=False):
         """
         generates and returns e-invoice for given invoice
 
-        e-invoice contains IRN, QR-code and signature
+        e-invoice contains IRN, QR-code and signature. with raw=True the
+        decrypted JSON is returned as bytes. with validate=True the invoice
+        is validated locally first, raising `ValidationError` if invalid.
         """
+        if validate:
+            _check_invoice(invoice)
+        e_invoice = self._get_saved_e_invoice(invoice, raw)
+        if e_invoice is not None:
+            return e_invoice
         url = f"{self.base_url}/eicore/v1.03/Invoice"
-        return self.post(url, invoice)
+        replay = partial(self._replay_irn, raw=raw)
+        e_invoice = self._request("POST", url, invoice, replay=replay, raw=raw)
+        self._save_e_invoice(invoice, e_invoice)
+        return e_invoice
+
+    def _replay_irn(self, response, err, raw=False):
+        """
+        returns the e-invoice generated by an earlier attempt of a retried
+        request, instead of the duplicate IRN error
+        """
+        irn = _get_duplicate_irn(response)
+        if irn is None:
+            raise err
+        logger.info("IRN %s was generated by an earlier attempt", irn)
+        return self.get_e_invoice_by_irn(irn, raw=raw)
+
+    def generate_e_invoices(
+        self, invoices, max_workers=8, ordered=True, validate=False
+    ):
+        """
+        generates e-invoices for many invoices concurrently
+
+        yields a `BulkResult(item, data, error)` for every invoice. a failed
+        invoice sets `error` and doesn't stop the remaining invoices.
+        """
+        func = partial(self.generate_e_invoice, validate=validate)
+        return _run_bulk(func, invoices, max_workers, ordered)
 
-    def get_e_invoice_by_irn(self, irn, sup_gstin=None):
+    def get_e_invoice_by_irn(self, irn, sup_gstin=None, raw=False):
         """
         returns e-invoice for an already generated irn
+
+        e-invoices in the ledger of the session are returned without calling
+        the IRP
         """
+        e_invoice = self._find_in_ledger(raw, irn=irn)
+        if e_invoice is not None:
+            return e_invoice
         url = f"{self.base_url}/eicore/v1.03/Invoice/irn/{irn}"
-        return self.get(url)
+        return self.get(url, raw=raw)
+
+    def get_irn_by_doc_details(self, doc_type, doc_no, doc_date, raw=False):
+        """
+        returns e-invoice generated for the document of the session's GSTIN
+
+        doc_type is "INV", "CRN" or "DBN" and doc_date is like "12/09/2022"
+        """
+        doc_details = (doc_type, doc_no, doc_date)
+        e_invoice = self._find_in_ledger(raw, doc_details=doc_details)
+        if e_invoice is not None:
+            return e_invoice
+        url = _get_doc_details_url(self.base_url, doc_type, doc_no, doc_date)
+        return self.get(url, raw=raw)
+
+    def get_irns_by_doc_details(self, docs, max_workers=8, ordered=True):
+        """
+        fetches e-invoices of many documents concurrently
+
+        docs are dicts of `doc_type`, `doc_no` and `doc_date`. yields a
+        `BulkResult` for every document.
+        """
+        func = partial(_call_with_kwargs, self.get_irn_by_doc_details)
+        return _run_bulk(func, docs, max_workers, ordered)
+
+    def cancel_e_invoice(self, irn, reason, remarks, raw=False):
+        """
+        cancels the e-invoice, returns its `Irn` and `CancelDate`
+
+        reason is one of `codes.CancelReasons` (or its value). IRNs can be
+        cancelled only within 24 hours of generation.
+        """
+        url = f"{self.base_url}/eicore/v1.03/Invoice/Cancel"
+        data = _get_cancel_payload(irn, reason, remarks)
+        cancelled = self.post(url, data, raw=raw)
+        # lookups of cancelled e-invoices go to the IRP
+        self._remove_from_ledger(irn)
+        return cancelled
+
+    def cancel_e_invoices(self, cancellations, max_workers=8, ordered=True):
+        """
+        cancels many e-invoices concurrently
+
+        cancellations are dicts of `irn`, `reason` and `remarks`. yields a
+        `BulkResult` for every cancellation.
+        """
+        func = partial(_call_with_kwargs, self.cancel_e_invoice)
+        return _run_bulk(func, cancellations, max_workers, ordered)
+
+    def generate_ewaybill_by_irn(self, irn, distance, raw=False, **kwargs):
+        """
+        generates e-way bill of the e-invoice, returns `EwbNo`, `EwbDt` and
+        `EwbValidTill`
+
+        other arguments are the same as of `get_ewb_dtls`, like trans_id,
+        trans_mode or veh_no.
+        """
+        url = f"{self.base_url}/eiewb/v1.03/ewaybill"
+        data = _get_ewaybill_payload(irn, distance, kwargs)
+        ewaybill = self.post(url, data, raw=raw)
+        self._save_ewaybill(irn, ewaybill)
+        return ewaybill
+
+    def generate_ewaybills_by_irn(
+        self, ewaybills, max_workers=8, ordered=True
+    ):
+        """
+        generates many e-way bills concurrently
+
+        ewaybills are dicts of the arguments of `generate_ewaybill_by_irn`.
+        yields a `BulkResult` for every e-way bill.
+        """
+        func = partial(_call_with_kwargs, self.generate_ewaybill_by_irn)
+        return _run_bulk(func, ewaybills, max_workers, ordered)
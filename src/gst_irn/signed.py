@@ -0,0 +1,153 @@
+"""
+decodes and verifies SignedInvoice and SignedQRCode of e-invoices
+
+both are JWTs signed (RS256) by the IRP. their payload has the signed data as
+JSON, so fields like AckNo, Irn or ItemCnt can be read without fetching the
+e-invoice again.
+
+    certificate = load_certificate_file("einv_sandbox.pem")
+    invoice = decode_signed_invoice(e_invoice["SignedInvoice"], certificate)
+    qr_data = decode_signed_qr_code(e_invoice["SignedQRCode"], certificate)
+
+the certificate (or public key) for verifying is published by NIC on the
+e-invoice portal.
+"""
+
+import json
+from collections import namedtuple
+from functools import lru_cache
+
+# result of every token of `decode_signed_tokens`, exactly one of data /
+# error is set
+DecodeResult = namedtuple("DecodeResult", ["item", "data", "error"])
+
+
+class SignatureError(Exception):
+    """
+    raised for tokens which are malformed or whose signature doesn't match
+    """
+
+
+def _to_text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+@lru_cache(maxsize=16)
+def load_certificate(certificate):
+    """
+    returns the public key of a PEM certificate or PEM public key. loaded
+    keys are cached.
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives.serialization import (
+        load_pem_public_key,
+    )
+
+    pem = _to_text(certificate).strip().encode()
+    if b"-----BEGIN CERTIFICATE-----" in pem:
+        return x509.load_pem_x509_certificate(pem).public_key()
+    return load_pem_public_key(pem)
+
+
+def load_certificate_file(path):
+    """
+    returns the certificate (PEM) saved in the file, to be passed to the
+    decode functions
+    """
+    with open(path) as file:
+        certificate = file.read()
+    # loaded once and cached
+    load_certificate(certificate)
+    return certificate
+
+
+def decode_signed_data(token, certificate):
+    """
+    verifies the token with the certificate and returns its data
+
+    the signature is not verified if certificate is None. raises
+    `SignatureError` for invalid tokens.
+    """
+    import jwt
+
+    try:
+        if certificate is None:
+            payload = jwt.decode(
+                token,
+                options={"verify_signature": False},
+                algorithms=["RS256"],
+            )
+        else:
+            # keys can be passed as parsed objects too
+            if isinstance(certificate, (str, bytes)):
+                certificate = load_certificate(certificate)
+            payload = jwt.decode(token, certificate, algorithms=["RS256"])
+    except jwt.InvalidTokenError as err:
+        raise SignatureError(f"invalid signed data: {err}") from err
+
+    data = payload.get("data")
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError as err:
+            raise SignatureError("signed data is not JSON") from err
+    return data
+
+
+def decode_signed_invoice(signed_invoice, certificate):
+    """
+    returns the invoice with Irn, AckNo and AckDt from SignedInvoice
+    """
+    return decode_signed_data(signed_invoice, certificate)
+
+
+def decode_signed_qr_code(signed_qr_code, certificate):
+    """
+    returns the data of SignedQRCode, like SellerGstin, DocNo, TotInvVal,
+    ItemCnt, MainHsnCode and Irn
+    """
+    return decode_signed_data(signed_qr_code, certificate)
+
+
+def _decode_many(tokens, certificate):
+    results = []
+    for token in tokens:
+        try:
+            results.append((decode_signed_data(token, certificate), None))
+        except SignatureError as err:
+            results.append((None, err))
+    return results
+
+
+def decode_signed_tokens(tokens, certificate, max_workers=None, chunksize=256):
+    """
+    verifies and decodes many tokens across a pool of processes
+
+    certificate is the PEM certificate or public key (or None). returns a
+    list of `DecodeResult(item, data, error)` in the order of the tokens. an
+    invalid token sets `error` to the `SignatureError`. small batches are
+    decoded in this process.
+    """
+    tokens = list(tokens)
+    certificate = _to_text(certificate)
+    if len(tokens) <= chunksize:
+        results = _decode_many(tokens, certificate)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = [
+            tokens[start : start + chunksize]
+            for start in range(0, len(tokens), chunksize)
+        ]
+        results = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_decode_many, chunk, certificate)
+                for chunk in chunks
+            ]
+            for future in futures:
+                results.extend(future.result())
+    return [
+        DecodeResult(token, data, error)
+        for token, (data, error) in zip(tokens, results)
+    ]
@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+# requests per second allowed for each endpoint family, by default
+DEFAULT_LIMITS = {
+    "auth": 1,
+    "master": 10,
+    "invoice": 10,
+}
+
+
+def is_throttled(response):
+    return response.status_code == 429
+
+
+def get_backoff_delay(attempt, backoff_factor=0.5, max_delay=30):
+    """
+    returns the seconds to wait before retrying, with exponential backoff
+    and full jitter. attempt is 0 for the first retry.
+    """
+    delay = min(max_delay, backoff_factor * (2**attempt))
+    return random.uniform(0, delay)
+
+
+def get_endpoint_family(url):
+    """
+    returns the endpoint family (auth, master or invoice) of the url
+    """
+    path = urlparse(url).path.lower()
+    if path.endswith("/auth"):
+        return "auth"
+    if "/master/" in path:
+        return "master"
+    return "invoice"
+
+
+class TokenBucket:
+    """
+    token bucket allowing `rate` requests per second with bursts of `burst`
+
+    the rate adapts to throttling: it is halved by `backoff` and slowly
+    increased back to the configured rate by `recover`.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._last_backoff = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        takes a token and returns the seconds to wait before using it
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """
+        waits for a token, returns the seconds waited
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def backoff(self, factor=0.5):
+        with self._lock:
+            # requests in flight get throttled together, back off once
+            now = time.monotonic()
+            if now - self._last_backoff < 1 / self.rate:
+                return
+            self._last_backoff = now
+            self.rate = max(self.min_rate, self.rate * factor)
+
+    def recover(self, step=0.02):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(
+                    self.max_rate, self.rate + self.max_rate * step
+                )
+
+
+class RateLimiter:
+    """
+    rate limits requests per GSTIN and endpoint family
+
+    `limits` overrides the requests per second of DEFAULT_LIMITS. the same
+    limiter can be shared by multiple sessions.
+    """
+
+    def __init__(self, limits=None, burst=None):
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.burst = burst
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, family, gstin):
+        key = (gstin, family)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate = self.limits.get(family, self.limits["invoice"])
+                bucket = TokenBucket(rate, burst=self.burst)
+                self._buckets[key] = bucket
+                self._stats.setdefault(
+                    family, {"requests": 0, "waited": 0.0, "throttled": 0}
+                )
+            return bucket
+
+    def _record(self, family, name, value):
+        with self._lock:
+            self._stats[family][name] += value
+
+    def reserve(self, family, gstin=None):
+        """
+        takes a token, returns the seconds to wait before sending the request
+        """
+        wait = self._get_bucket(family, gstin).reserve()
+        self._record(family, "requests", 1)
+        self._record(family, "waited", wait)
+        return wait
+
+    def acquire(self, family, gstin=None):
+        """
+        waits till the request can be sent, returns the seconds waited
+        """
+        wait = self.reserve(family, gstin)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def update(self, family, gstin=None, throttled=False):
+        """
+        adapts the rate to the response of a request
+        """
+        bucket = self._get_bucket(family, gstin)
+        if throttled:
+            self._record(family, "throttled", 1)
+            bucket.backoff()
+        else:
+            bucket.recover()
+
+    def get_stats(self):
+        """
+        returns requests, total seconds waited and throttled responses for
+        every endpoint family
+        """
+        with self._lock:
+            return {
+                family: dict(stats) for family, stats in self._stats.items()
+            }
+
+    def get_rates(self):
+        """
+        returns the current requests per second of every (gstin, family)
+        """
+        with self._lock:
+            return {key: b.rate for key, b in self._buckets.items()}
@@ -0,0 +1,304 @@
+import datetime as dt
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# tokens expiring within this margin are not reused
+EXPIRY_MARGIN = dt.timedelta(minutes=10)
+
+
+def get_token_expiry(token):
+    """
+    returns expiry time of the stored token as datetime, None if invalid
+    """
+    try:
+        return dt.datetime.strptime(token["expiry_time"], "%Y-%m-%d %H:%M:%S")
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def is_expiry_usable(expiry):
+    """
+    checks if a token expiring at `expiry` is valid for EXPIRY_MARGIN
+    """
+    if expiry is None:
+        return False
+    return expiry >= (dt.datetime.now() + EXPIRY_MARGIN)
+
+
+def is_token_usable(token):
+    """
+    checks if the stored token is valid for at least EXPIRY_MARGIN
+    """
+    if not token:
+        return False
+    return is_expiry_usable(get_token_expiry(token))
+
+
+class _ThreadLocks:
+    """
+    one lock per key, shared by all the threads of the process
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+class TokenLock:
+    """
+    lock for refreshing a token. can be acquired and released from different
+    threads, so that it can be used from an event loop too.
+    """
+
+    def __init__(self, thread_lock):
+        self._thread_lock = thread_lock
+
+    def acquire(self):
+        self._thread_lock.acquire()
+
+    def release(self):
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class TokenStore:
+    """
+    base class for token stores
+
+    a token is a dict with `token`, `sek` and `expiry_time`. sessions take
+    the `lock` of a key before refreshing its token, so that only one of them
+    calls the auth API while the others wait and reuse the stored token.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, token):
+        raise NotImplementedError
+
+    def lock(self, key):
+        raise NotImplementedError
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    keeps tokens in memory. shared by the threads of a single process.
+    """
+
+    def __init__(self):
+        self._tokens = {}
+        self._locks = _ThreadLocks()
+
+    def get(self, key):
+        return self._tokens.get(key)
+
+    def set(self, key, token):
+        self._tokens[key] = dict(token)
+
+    def lock(self, key):
+        return TokenLock(self._locks.get(key))
+
+
+def _lock_file(fd):
+    try:
+        import fcntl
+
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    except ImportError:
+        import msvcrt
+
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(fd):
+    try:
+        import fcntl
+
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    except ImportError:
+        import msvcrt
+
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileTokenLock(TokenLock):
+    def __init__(self, thread_lock, path):
+        super().__init__(thread_lock)
+        self._path = path
+        self._fd = None
+
+    def acquire(self):
+        super().acquire()
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT)
+            _lock_file(self._fd)
+        except BaseException:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            super().release()
+            raise
+
+    def release(self):
+        try:
+            _unlock_file(self._fd)
+            os.close(self._fd)
+        finally:
+            self._fd = None
+            super().release()
+
+
+class FileTokenStore(TokenStore):
+    """
+    keeps every token in a json file inside `cache_dir`
+
+    files are written atomically and refreshes are locked with a lock file,
+    so the store can be shared by multiple processes.
+    """
+
+    def __init__(self, cache_dir="tokens_cache"):
+        self.cache_dir = Path(cache_dir)
+        self._locks = _ThreadLocks()
+
+    def _get_path(self, key, suffix=".json"):
+        return self.cache_dir / f"{key}{suffix}"
+
+    def get(self, key):
+        try:
+            return json.loads(self._get_path(key).read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as err:
+            logger.warning("could not read stored token: %s", err)
+            return None
+
+    def set(self, key, token):
+        path = self._get_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as tmp:
+                    tmp.write(json.dumps(token))
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as err:
+            logger.warning("could not store token: %s", err)
+
+    def lock(self, key):
+        return FileTokenLock(
+            self._locks.get(key), self._get_path(key, suffix=".lock")
+        )
+
+
+class SQLiteTokenLock(TokenLock):
+    def __init__(self, thread_lock, store, key):
+        super().__init__(thread_lock)
+        self._store = store
+        self._key = key
+        self._conn = None
+
+    def acquire(self):
+        super().acquire()
+        try:
+            # an immediate transaction blocks writers of other processes
+            self._conn = self._store._connect()
+            self._conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._close()
+            super().release()
+            raise
+        self._store._lock_conns[self._key] = self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def release(self):
+        try:
+            self._store._lock_conns.pop(self._key, None)
+            self._conn.commit()
+            self._close()
+        finally:
+            super().release()
+
+
+class SQLiteTokenStore(TokenStore):
+    """
+    keeps tokens in a SQLite database. can be shared by multiple processes.
+    """
+
+    def __init__(self, path="tokens_cache.sqlite3", timeout=60):
+        self.path = str(path)
+        self.timeout = timeout
+        self._locks = _ThreadLocks()
+        # connections holding the lock of a key
+        self._lock_conns = {}
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "key TEXT PRIMARY KEY, token TEXT, sek TEXT, expiry_time TEXT"
+                ")"
+            )
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+
+    def _execute(self, sql, params, conn=None):
+        if conn is not None:
+            return conn.execute(sql, params).fetchall()
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def get(self, key):
+        rows = self._execute(
+            "SELECT token, sek, expiry_time FROM tokens WHERE key = ?", (key,)
+        )
+        if not rows:
+            return None
+        token, sek, expiry_time = rows[0]
+        return {"token": token, "sek": sek, "expiry_time": expiry_time}
+
+    def set(self, key, token):
+        self._execute(
+            "INSERT OR REPLACE INTO tokens (key, token, sek, expiry_time) "
+            "VALUES (?, ?, ?, ?)",
+            (key, token["token"], token["sek"], token["expiry_time"]),
+            # the lock holder writes within its own transaction
+            conn=self._lock_conns.get(key),
+        )
+
+    def lock(self, key):
+        return SQLiteTokenLock(self._locks.get(key), self, key)
@@ -0,0 +1,181 @@
+"""
+transports sending the HTTP requests of `Session`
+
+    # HTTP/2, many concurrent requests share one connection
+    transport = HTTPXTransport(http2=True)
+    session = Session(..., transport=transport)
+
+a transport returns responses with `status_code`, `content` and `text`, like
+those of requests, and raises `requests.ConnectionError` or
+`requests.Timeout` for network failures, which sessions retry. so callers
+handle the same errors whichever transport is used.
+
+`RequestsTransport` is used by default. other transports can be created by
+subclassing `Transport`, like `mock_irp.MockTransport` which calls the mock
+IRP within the process.
+"""
+
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def get_http_session(pool_size=10, connect_retries=3, backoff_factor=0.5):
+    """
+    creates a pooled http session which keeps connections alive
+
+    the same http session can be passed to multiple `Session` objects so that
+    they share the underlying connections. only connection failures are
+    retried here, as resending an invoice after it has reached the IRP can
+    create duplicates.
+    """
+    retries = Retry(
+        total=None,
+        connect=connect_retries,
+        read=0,
+        redirect=0,
+        status=0,
+        other=0,
+        backoff_factor=backoff_factor,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retries,
+    )
+    http = requests.Session()
+    http.mount("https://", adapter)
+    http.mount("http://", adapter)
+    return http
+
+
+class Response:
+    """
+    response of transports not using requests or httpx, like fakes
+    """
+
+    __slots__ = ("status_code", "content", "headers")
+
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+
+class Transport:
+    """
+    base class of transports. transports are shared by the threads of a
+    session (and by sessions), so `request` must be thread-safe.
+    """
+
+    def request(self, method, url, data=None, headers=None, timeout=None):
+        """
+        sends the request and returns the response
+
+        data is the body as bytes, timeout is (connect, read) in seconds
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RequestsTransport(Transport):
+    """
+    HTTP/1.1 transport using a pooled `requests.Session`
+
+    the http session is closed with the transport, unless it was passed by
+    the caller.
+    """
+
+    def __init__(self, http_session=None, pool_size=10, connect_retries=3):
+        self._owns_http = http_session is None
+        if http_session is None:
+            http_session = get_http_session(
+                pool_size=pool_size, connect_retries=connect_retries
+            )
+        self.http_session = http_session
+
+    def request(self, method, url, data=None, headers=None, timeout=None):
+        return self.http_session.request(
+            method, url, data=data, headers=headers, timeout=timeout
+        )
+
+    def close(self):
+        if self._owns_http:
+            self.http_session.close()
+
+
+@lru_cache(maxsize=16)
+def _get_httpx_timeout(timeout):
+    import httpx
+
+    if isinstance(timeout, tuple):
+        connect_timeout, read_timeout = timeout
+        return httpx.Timeout(read_timeout, connect=connect_timeout)
+    return httpx.Timeout(timeout)
+
+
+class HTTPXTransport(Transport):
+    """
+    transport using a `httpx.Client`, over HTTP/2 by default
+
+    with HTTP/2 the concurrent requests of all the threads are multiplexed
+    over one connection per host, instead of a connection per request in
+    flight. servers not supporting HTTP/2 are sent HTTP/1.1 requests.
+
+    needs httpx, and h2 for HTTP/2 (`pip install gst-e-invoicing[http2]`).
+    """
+
+    def __init__(
+        self, http2=True, max_connections=10, connect_retries=3, client=None
+    ):
+        import httpx
+
+        self._httpx = httpx
+        self._owns_client = client is None
+        if client is None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            )
+            transport = httpx.HTTPTransport(
+                http2=http2, limits=limits, retries=connect_retries
+            )
+            client = httpx.Client(transport=transport, http2=http2)
+        self.client = client
+
+    def request(self, method, url, data=None, headers=None, timeout=None):
+        httpx = self._httpx
+        if isinstance(timeout, list):
+            timeout = tuple(timeout)
+        try:
+            return self.client.request(
+                method,
+                url,
+                content=data,
+                headers=headers,
+                timeout=_get_httpx_timeout(timeout),
+            )
+        except httpx.ConnectTimeout as err:
+            raise requests.ConnectTimeout(str(err)) from err
+        except httpx.TimeoutException as err:
+            raise requests.ReadTimeout(str(err)) from err
+        except httpx.TransportError as err:
+            raise requests.ConnectionError(str(err)) from err
+
+    def close(self):
+        if self._owns_client:
+            self.client.close()
@@ -0,0 +1,393 @@
+"""
+validates invoices locally before sending them to the IRP
+
+the rules follow https://einvoice1.gst.gov.in/Documents/EINVOICE_SCHEMA.xlsx
+and are compiled once, when the module is imported.
+
+    errors = validate_invoice(invoice)
+    if errors:
+        for error in errors:
+            print(error.path, error.message)
+"""
+
+import re
+from collections import namedtuple
+
+from .codes import States
+from .models import Node
+
+# error in a field of the invoice, like ("ItemList[0].TotItemVal", "...")
+FieldError = namedtuple("FieldError", ["path", "message"])
+
+# difference (in rupees) allowed between given and computed amounts
+TOLERANCE = 1
+
+_STATE_CODES = frozenset(state.value for state in States)
+_GSTIN_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_GST_RATES = frozenset([0, 0.1, 0.25, 1, 1.5, 3, 5, 6, 7.5, 12, 18, 28, 40])
+_IGST_SUPPLY_TYPES = frozenset(["SEZWP", "SEZWOP", "EXPWP", "EXPWOP", "DEXP"])
+
+
+def is_valid_gstin(gstin):
+    """
+    returns True if the check digit (last character) of the GSTIN is valid
+    """
+    total = 0
+    for i, char in enumerate(gstin[:14]):
+        value = _GSTIN_CHARS.find(char) * (2 if i % 2 else 1)
+        total += value // 36 + value % 36
+    return _GSTIN_CHARS[(36 - total % 36) % 36] == gstin[14:]
+
+
+def _string(min_len=1, max_len=None, pattern=None, choices=None):
+    """
+    returns a check for strings of given length, regex pattern or choices
+    """
+    regex = re.compile(pattern) if pattern else None
+
+    def check(value):
+        if not isinstance(value, str):
+            return "must be a string"
+        if choices is not None:
+            if value not in choices:
+                return f"must be one of {', '.join(sorted(choices))}"
+            return None
+        if len(value) < min_len or (max_len and len(value) > max_len):
+            return f"must have {min_len} to {max_len} characters"
+        if regex is not None and not regex.match(value):
+            return f"must match {pattern}"
+        return None
+
+    return check
+
+
+def _number(min_value=0, max_value=None, choices=None):
+    """
+    returns a check for numbers within a range or choices
+    """
+
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return "must be a number"
+        if choices is not None and value not in choices:
+            return f"must be one of {', '.join(map(str, sorted(choices)))}"
+        if value < min_value or (max_value is not None and value > max_value):
+            return f"must be between {min_value} and {max_value}"
+        return None
+
+    return check
+
+
+def _gstin(allow_urp=False):
+    pattern = r"^[0-9]{2}[0-9A-Z]{13}$"
+    check_format = _string(
+        pattern=pattern + "|^URP$" if allow_urp else pattern
+    )
+
+    def check(value):
+        message = check_format(value)
+        if message is None and value != "URP" and not is_valid_gstin(value):
+            return "has an invalid check digit"
+        return message
+
+    return check
+
+
+_YES_NO = _string(choices={"Y", "N"})
+_STATE = _string(choices=_STATE_CODES)
+_PIN = _number(100000, 999999)
+_AMOUNT = _number()
+_NAME = _string(3, 100)
+_ADDRESS = _string(1, 100)
+_LOCATION = _string(3, 50)
+
+# (key, required, check) of every field, per section
+_SCHEMA = {
+    "TranDtls": (
+        ("TaxSch", True, _string(choices={"GST"})),
+        (
+            "SupTyp",
+            True,
+            _string(choices={"B2B"} | _IGST_SUPPLY_TYPES),
+        ),
+        ("RegRev", False, _YES_NO),
+        ("EcmGstin", False, _gstin()),
+        ("IgstOnIntra", False, _YES_NO),
+    ),
+    "DocDtls": (
+        ("Typ", True, _string(pattern=r"(?i)^(INV|CRN|DBN)$")),
+        ("No", True, _string(pattern=r"^[a-zA-Z1-9][a-zA-Z0-9/-]{0,15}$")),
+        ("Dt", True, _string(pattern=r"^[0-3][0-9]/[0-1][0-9]/20[0-9]{2}$")),
+    ),
+    "SellerDtls": (
+        ("Gstin", True, _gstin()),
+        ("LglNm", True, _NAME),
+        ("TrdNm", False, _NAME),
+        ("Addr1", True, _ADDRESS),
+        ("Addr2", False, _string(3, 100)),
+        ("Loc", True, _LOCATION),
+        ("Pin", True, _PIN),
+        ("Stcd", True, _STATE),
+        ("Ph", False, _string(6, 12, pattern=r"^[0-9]+$")),
+        ("Em", False, _string(6, 100)),
+    ),
+    "BuyerDtls": (
+        ("Gstin", True, _gstin(allow_urp=True)),
+        ("LglNm", True, _NAME),
+        ("TrdNm", False, _NAME),
+        ("Pos", True, _STATE),
+        ("Addr1", True, _ADDRESS),
+        ("Addr2", False, _string(3, 100)),
+        ("Loc", True, _LOCATION),
+        ("Pin", False, _PIN),
+        ("Stcd", True, _STATE),
+        ("Ph", False, _string(6, 12, pattern=r"^[0-9]+$")),
+        ("Em", False, _string(6, 100)),
+    ),
+    "DispDtls": (
+        ("Nm", True, _NAME),
+        ("Addr1", True, _ADDRESS),
+        ("Loc", True, _LOCATION),
+        ("Pin", True, _PIN),
+        ("Stcd", True, _STATE),
+    ),
+    "ShipDtls": (
+        ("Gstin", False, _gstin(allow_urp=True)),
+        ("LglNm", True, _NAME),
+        ("Addr1", True, _ADDRESS),
+        ("Loc", True, _LOCATION),
+        ("Pin", True, _PIN),
+        ("Stcd", True, _STATE),
+    ),
+    "Item": (
+        ("SlNo", True, _string(1, 6)),
+        ("IsServc", True, _YES_NO),
+        ("HsnCd", True, _string(pattern=r"^([0-9]{4}|[0-9]{6}|[0-9]{8})$")),
+        ("Qty", False, _AMOUNT),
+        ("FreeQty", False, _AMOUNT),
+        ("Unit", False, _string(3, 8)),
+        ("UnitPrice", True, _AMOUNT),
+        ("TotAmt", True, _AMOUNT),
+        ("Discount", False, _AMOUNT),
+        ("PreTaxVal", False, _AMOUNT),
+        ("AssAmt", True, _AMOUNT),
+        ("GstRt", True, _number(choices=_GST_RATES)),
+        ("IgstAmt", False, _AMOUNT),
+        ("CgstAmt", False, _AMOUNT),
+        ("SgstAmt", False, _AMOUNT),
+        ("CesRt", False, _number(0, 100)),
+        ("CesAmt", False, _AMOUNT),
+        ("CesNonAdvlAmt", False, _AMOUNT),
+        ("StateCesRt", False, _number(0, 100)),
+        ("StateCesAmt", False, _AMOUNT),
+        ("StateCesNonAdvlAmt", False, _AMOUNT),
+        ("OthChrg", False, _number(min_value=float("-inf"))),
+        ("TotItemVal", True, _AMOUNT),
+    ),
+    "ValDtls": (
+        ("AssVal", True, _AMOUNT),
+        ("CgstVal", False, _AMOUNT),
+        ("SgstVal", False, _AMOUNT),
+        ("IgstVal", False, _AMOUNT),
+        ("CesVal", False, _AMOUNT),
+        ("StCesVal", False, _AMOUNT),
+        ("Discount", False, _AMOUNT),
+        ("OthChrg", False, _number(min_value=float("-inf"))),
+        ("RndOffAmt", False, _number(-99.99, 99.99)),
+        ("TotInvVal", True, _AMOUNT),
+        ("TotInvValFc", False, _AMOUNT),
+    ),
+    "EwbDtls": (
+        ("Distance", True, _number(0, 4000)),
+        ("TransMode", False, _string(choices={"1", "2", "3", "4"})),
+    ),
+}
+
+# (key, required) of the sections of an invoice, except ItemList
+_SECTIONS = (
+    ("TranDtls", True),
+    ("DocDtls", True),
+    ("SellerDtls", True),
+    ("BuyerDtls", True),
+    ("DispDtls", False),
+    ("ShipDtls", False),
+    ("ValDtls", True),
+    ("EwbDtls", False),
+)
+
+# amounts of an item adding up to TotItemVal, along with AssAmt
+_ITEM_TOTAL_KEYS = (
+    "IgstAmt",
+    "CgstAmt",
+    "SgstAmt",
+    "CesAmt",
+    "CesNonAdvlAmt",
+    "StateCesAmt",
+    "StateCesNonAdvlAmt",
+    "OthChrg",
+)
+
+# totals of ValDtls and the item amounts they add up
+_VAL_TOTALS = (
+    ("AssVal", ("AssAmt",)),
+    ("CgstVal", ("CgstAmt",)),
+    ("SgstVal", ("SgstAmt",)),
+    ("IgstVal", ("IgstAmt",)),
+    ("CesVal", ("CesAmt", "CesNonAdvlAmt")),
+    ("StCesVal", ("StateCesAmt", "StateCesNonAdvlAmt")),
+)
+
+
+def _amount(node, key):
+    """
+    returns the amount, 0 if it is missing or not a number
+    """
+    value = node.get(key)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return 0
+
+
+def _check_fields(node, rules, path, errors):
+    if not isinstance(node, dict):
+        errors.append(FieldError(path, "must be an object"))
+        return False
+    for key, required, check in rules:
+        value = node.get(key)
+        if value is None:
+            if required:
+                errors.append(FieldError(f"{path}.{key}", "is required"))
+            continue
+        message = check(value)
+        if message is not None:
+            errors.append(FieldError(f"{path}.{key}", message))
+    return True
+
+
+def _check_amount(path, given, expected, errors):
+    if abs(given - expected) > TOLERANCE:
+        errors.append(
+            FieldError(path, f"is {given} but computed as {expected:.2f}")
+        )
+
+
+def _is_igst(invoice):
+    """
+    returns True if IGST applies, instead of CGST and SGST
+    """
+    tran_dtls = invoice.get("TranDtls") or {}
+    if tran_dtls.get("IgstOnIntra") == "Y":
+        return True
+    if tran_dtls.get("SupTyp") in _IGST_SUPPLY_TYPES:
+        return True
+    seller_state = (invoice.get("SellerDtls") or {}).get("Stcd")
+    place_of_supply = (invoice.get("BuyerDtls") or {}).get("Pos")
+    return seller_state != place_of_supply
+
+
+def _check_item(item, path, is_igst, errors):
+    ass_amt = _amount(item, "AssAmt")
+    tot_amt = _amount(item, "TotAmt")
+    if "Qty" in item:
+        _check_amount(
+            f"{path}.TotAmt",
+            tot_amt,
+            _amount(item, "UnitPrice") * _amount(item, "Qty"),
+            errors,
+        )
+    _check_amount(
+        f"{path}.AssAmt",
+        ass_amt,
+        tot_amt - _amount(item, "Discount"),
+        errors,
+    )
+
+    tax = ass_amt * _amount(item, "GstRt") / 100
+    if is_igst:
+        expected = {"IgstAmt": tax, "CgstAmt": 0, "SgstAmt": 0}
+    else:
+        expected = {"IgstAmt": 0, "CgstAmt": tax / 2, "SgstAmt": tax / 2}
+    for key, value in expected.items():
+        _check_amount(f"{path}.{key}", _amount(item, key), value, errors)
+
+    total = ass_amt + sum(_amount(item, key) for key in _ITEM_TOTAL_KEYS)
+    _check_amount(
+        f"{path}.TotItemVal", _amount(item, "TotItemVal"), total, errors
+    )
+
+
+def _check_totals(val_dtls, items, errors):
+    for key, item_keys in _VAL_TOTALS:
+        if key in val_dtls:
+            total = sum(_amount(item, k) for item in items for k in item_keys)
+            _check_amount(
+                f"ValDtls.{key}", _amount(val_dtls, key), total, errors
+            )
+
+    total = sum(_amount(val_dtls, key) for key, _ in _VAL_TOTALS)
+    total += _amount(val_dtls, "OthChrg") + _amount(val_dtls, "RndOffAmt")
+    total -= _amount(val_dtls, "Discount")
+    _check_amount(
+        "ValDtls.TotInvVal", _amount(val_dtls, "TotInvVal"), total, errors
+    )
+
+
+def validate_invoice(invoice):
+    """
+    returns the list of `FieldError` of the invoice, empty if it is valid
+
+    checks the mandatory fields, their formats and codes, and the item and
+    invoice amounts. the invoice can be a dict or a `models.Invoice`.
+    """
+    if isinstance(invoice, Node):
+        invoice = invoice.to_dict()
+    errors = []
+    if not isinstance(invoice, dict):
+        return [FieldError("", "must be an object")]
+    if not invoice.get("Version"):
+        errors.append(FieldError("Version", "is required"))
+
+    for section, required in _SECTIONS:
+        node = invoice.get(section)
+        if node is None:
+            if required:
+                errors.append(FieldError(section, "is required"))
+            continue
+        _check_fields(node, _SCHEMA[section], section, errors)
+
+    items = invoice.get("ItemList")
+    if not isinstance(items, list) or not items:
+        errors.append(FieldError("ItemList", "must have at least one item"))
+        return errors
+
+    is_igst = _is_igst(invoice)
+    item_rules = _SCHEMA["Item"]
+    serial_numbers = set()
+    valid_items = []
+    for i, item in enumerate(items):
+        path = f"ItemList[{i}]"
+        if not _check_fields(item, item_rules, path, errors):
+            continue
+        valid_items.append(item)
+        _check_item(item, path, is_igst, errors)
+        sl_no = item.get("SlNo")
+        if sl_no in serial_numbers:
+            errors.append(FieldError(f"{path}.SlNo", "is repeated"))
+        serial_numbers.add(sl_no)
+
+    val_dtls = invoice.get("ValDtls")
+    if isinstance(val_dtls, dict):
+        _check_totals(val_dtls, valid_items, errors)
+    return errors
+
+
+def validate_invoices(invoices):
+    """
+    validates many invoices, returns {index: errors} of the invalid ones
+    """
+    results = {}
+    for index, invoice in enumerate(invoices):
+        errors = validate_invoice(invoice)
+        if errors:
+            results[index] = errors
+    return results